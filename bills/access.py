@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from crm import response_cache
+from .models import Category, Product
+from .categories import owned_categories, parse_path
+
+
+def product_access_key(admin_id, version, product_id):
+    return 'bills:product_access:{}:{}:{}'.format(admin_id, version, product_id)
+
+
+def accessible_products(admin, products_id):
+    # one entry per checked product, a new access version drops all of an admin's entries at once
+    version = '.'.join(str(value) for value in response_cache.versions('product_access', [admin.id]))
+    keys = {product_access_key(admin.id, version, pk): pk for pk in set(products_id)}
+    cached = cache.get_many(keys)
+    accessible = {keys[key] for key, allowed in cached.items() if allowed}
+    missing = {pk for key, pk in keys.items() if key not in cached}
+    if missing:
+        found = set(Product.objects.filter(pk__in=missing).filter(
+            Q(user=admin) | Q(category__in=owned_categories(Category.objects.all(), [admin]))
+        ).values_list('id', flat=True))
+        cache.set_many({key: pk in found for key, pk in keys.items() if pk in missing},
+                       settings.PRODUCT_ACCESS_CACHE_TIMEOUT)
+        accessible |= found
+    return accessible
+
+
+def inaccessible_products(admin, products_id):
+    return set(products_id) - accessible_products(admin, products_id)
+
+
+def category_owners(category_id):
+    if category_id is None:
+        return set()
+    path = Category.objects.filter(pk=category_id).values_list(
+        'path', flat=True).first()
+    if path is None:
+        return set()
+    return set(Category.objects.filter(pk__in=parse_path(path)+[category_id]).values_list('user', flat=True))
+
+
+def invalidate_product_access(owners):
+    response_cache.bump('product_access', owners)
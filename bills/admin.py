@@ -1,8 +1,9 @@
 from django.contrib import admin
 from .models import Category
+from crm.admin import DateTimeDisplayAdmin
 
 
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(DateTimeDisplayAdmin):
     list_display = ('name', 'user', 'parent',
                     'create_date_time', 'modify_date_time')
 
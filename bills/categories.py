@@ -0,0 +1,92 @@
+from django.db.models import CharField, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Cast, Concat, Substr
+from django.db.models.lookups import StartsWith
+
+SEPARATOR = '/'
+ROOT_PATH = SEPARATOR
+
+
+def subtree_prefix(path, pk):
+    return '{}{}{}'.format(path, pk, SEPARATOR)
+
+
+def child_path(category):
+    return subtree_prefix(category.path, category.pk)
+
+
+def parse_path(path):
+    return [int(pk) for pk in path.strip(SEPARATOR).split(SEPARATOR) if pk]
+
+
+def place(category):
+    parent = category.parent if category.parent_id else None
+    if parent is None:
+        category.path, category.depth = ROOT_PATH, 0
+        return
+    if category.pk is not None and (parent.pk == category.pk or category.pk in parse_path(parent.path)):
+        raise ValueError('a category can not be placed under itself')
+    category.path, category.depth = child_path(parent), parent.depth+1
+
+
+def move_subtree(model, old_prefix, new_prefix, depth_change):
+    return model._default_manager.filter(path__startswith=old_prefix).update(
+        path=Concat(Value(new_prefix), Substr('path', len(old_prefix)+1), output_field=CharField()),
+        depth=F('depth')+depth_change)
+
+
+def ancestors(category):
+    return type(category)._default_manager.filter(pk__in=parse_path(category.path)).order_by('depth')
+
+
+def descendants(category, include_self=False):
+    condition = Q(path__startswith=child_path(category))
+    if include_self:
+        condition |= Q(pk=category.pk)
+    return type(category)._default_manager.filter(condition)
+
+
+def subtree_products(category):
+    return category.products.model._default_manager.filter(
+        Q(category=category) | Q(category__path__startswith=child_path(category)))
+
+
+def is_owned_by(category, *users):
+    # the path already holds every ancestor, so one primary key lookup covers any depth
+    return type(category)._default_manager.filter(
+        pk__in=parse_path(category.path)+[category.pk], user__in=[user for user in users if user is not None]).exists()
+
+
+def owned_categories(queryset, users):
+    owners = queryset.model._default_manager.filter(user__in=users).filter(StartsWith(
+        OuterRef('path'), Concat('path', Cast('id', CharField()), Value(SEPARATOR))))
+    return queryset.filter(Q(user__in=users) | Exists(owners))
+
+
+def build_tree(nodes, key='id', parent_key='parent'):
+    by_id = {node[key]: dict(node, children=[]) for node in nodes}
+    roots = []
+    for node in by_id.values():
+        parent = by_id.get(node[parent_key])
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+
+def rebuild_paths(model):
+    parents = dict(model._default_manager.values_list('pk', 'parent'))
+    paths = {}
+    for pk in parents:
+        chain, seen = [], set()
+        while pk is not None and pk not in paths:
+            if pk in seen:
+                raise ValueError('category {} is its own ancestor'.format(pk))
+            seen.add(pk)
+            chain.append(pk)
+            pk = parents[pk]
+        for node in reversed(chain):
+            parent = parents[node]
+            paths[node] = ROOT_PATH if parent is None else subtree_prefix(
+                paths[parent], parent)
+    rows = [model(pk=pk, path=path, depth=len(parse_path(path)))
+            for pk, path in paths.items()]
+    model._default_manager.bulk_update(rows, ['path', 'depth'], batch_size=1000)
+    return len(rows)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import connections
+from datetime import datetime
+
+
+def can_allocate_ids(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def allocate_ids(model, count=1, using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                       [model._meta.db_table, model._meta.pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def format_bill_code(bill_id, date=None):
+    return settings.BILL_CODE_FORMAT.format(id=bill_id, date=date or datetime.now())
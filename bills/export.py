@@ -0,0 +1,71 @@
+import csv
+import json
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+FIELDS = [
+    ('bill_id', 'id'),
+    ('code', 'code'),
+    ('date_created', 'date_created'),
+    ('delivery_date', 'delivery_date'),
+    ('customer', 'user__username'),
+    ('creator', 'creator__username'),
+    ('cash_payment', 'cash_payment'),
+    ('debt', 'debt'),
+    ('used_credit', 'used_credit'),
+    ('product_id', 'sells__product_id'),
+    ('product', 'sells__product__name'),
+    ('price', 'sells__unit_price'),
+    ('discount', 'sells__discount'),
+    ('number', 'sells__number'),
+    ('line_total', 'sells__line_total'),
+    ('seller', 'sells__seller__username'),
+    ('seller_first_name', 'sells__seller__first_name'),
+    ('seller_last_name', 'sells__seller__last_name'),
+]
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_rows(bills, chunk_size=CHUNK_SIZE):
+    # one row per line item, bills without items still get a row through the outer join
+    rows = bills.order_by('date_created', 'id', 'sells__id').values_list(
+        *[lookup for name, lookup in FIELDS])
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, lookup in FIELDS])
+    for row in rows:
+        yield writer.writerow([export_value(value) for value in row])
+
+
+def jsonl_lines(rows):
+    names = [name for name, lookup in FIELDS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, map(export_value, row))), ensure_ascii=False) + '\n'
+
+
+def export_response(bills, file_type):
+    rows = export_rows(bills)
+    lines = csv_lines(rows) if file_type == 'csv' else jsonl_lines(rows)
+    response = StreamingHttpResponse(
+        lines, content_type=CONTENT_TYPES[file_type] + '; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="bills-{}.{}"'.format(
+        timezone.localdate().isoformat(), file_type)
+    return response
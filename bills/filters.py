@@ -0,0 +1,14 @@
+from django_filters import FilterSet
+from .models import Bill
+
+
+class BillExportFilter(FilterSet):
+
+    class Meta:
+        model = Bill
+
+        fields = {
+            'date_created': ['gte', 'lt'],
+            'user': ['exact'],
+            'creator': ['exact'],
+        }
@@ -0,0 +1,246 @@
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime
+from itertools import groupby
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from users.models import User
+from .access import inaccessible_products
+from .codes import allocate_ids, can_allocate_ids, format_bill_code
+from .inventory import InsufficientInventory, locked_inventory, reserve, shortfalls_of
+from .models import Bill, BillProduct, Product
+from .pricing import line_total
+from .signals import bills_imported
+from .tasks import send_bill_creation_notification
+
+BATCH_SIZE = 500
+MAX_ERRORS = 100
+FILE_TYPES = ['csv', 'jsonl']
+AMOUNT_FIELDS = ['cash_payment', 'debt', 'used_credit']
+
+
+class ImportResult:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.rows = 0
+        self.bills = 0
+        self.line_items = 0
+        self.error_count = 0
+        self.errors = []
+        self.tenant_ids = set()
+        self.customer_ids = set()
+        self.days = set()
+
+    def error(self, line, key, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'bill': key, 'errors': messages})
+
+    def as_dict(self):
+        return {'user': self.user_id, 'rows': self.rows, 'bills': self.bills, 'line_items': self.line_items,
+                'error_count': self.error_count, 'errors': self.errors}
+
+
+def read_rows(stream, file_type):
+    if file_type == 'csv':
+        yield from enumerate(csv.DictReader(stream), start=2)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def parse_int(row, name, errors, default=None, minimum=0):
+    value = row.get(name)
+    if value in (None, ''):
+        if default is None:
+            errors.append('{} is required'.format(name))
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        errors.append('{} is not a number'.format(name))
+        return default
+    if value < minimum:
+        errors.append('{} should be at least {}'.format(name, minimum))
+    return value
+
+
+def parse_bill(key, rows):
+    line, first = rows[0]
+    errors = []
+    bill = {'key': key, 'line': line, 'errors': errors, 'items': [],
+            'user': parse_int(first, 'user', errors),
+            'description': first.get('description') or None,
+            'delivery_date': None}
+    for name in AMOUNT_FIELDS:
+        bill[name] = parse_int(first, name, errors, default=0)
+    if first.get('delivery_date'):
+        try:
+            bill['delivery_date'] = parse_datetime(first['delivery_date'])
+        except ValueError:
+            pass
+        if bill['delivery_date'] is None:
+            errors.append('delivery_date is not a valid date')
+    for line, row in rows:
+        if row.get('product') in (None, ''):
+            continue
+        bill['items'].append((parse_int(row, 'product', errors), parse_int(row, 'seller', errors),
+                              parse_int(row, 'number', errors, default=1, minimum=1)))
+    return bill
+
+
+def pending_bills(rows, result):
+    # bills are streamed in batches, so the rows of a bill have to come one after another
+    seen = set()
+    for key, group in groupby(rows, key=lambda row: row[1].get('bill') if row[1] else None):
+        group = list(group)
+        result.rows += len(group)
+        if key in (None, ''):
+            for line, row in group:
+                result.error(line, None, [
+                    'row is not valid' if row is None else 'bill is required'])
+            continue
+        if key in seen:
+            for line, row in group:
+                result.error(line, key, [
+                    'rows of bill {} are not next to each other'.format(key)])
+            continue
+        seen.add(key)
+        yield parse_bill(key, group)
+
+
+def validate_batch(importer, batch, result):
+    # every reference of the batch is resolved with one query per kind
+    user_ids = {bill['user'] for bill in batch} - {None}
+    product_ids = {item[0] for bill in batch for item in bill['items']} - {None}
+    seller_ids = {item[1] for bill in batch for item in bill['items']} - {None}
+    admins = Q(admin=importer) | Q(admin=importer.admin_id) if importer.admin_id else Q(admin=importer)
+    tenants = dict(User.objects.filter(admins, id__in=user_ids).values_list('id', 'admin_id'))
+    sellers = set(User.objects.filter(id__in=seller_ids, admin=importer, groups__name='employee_user').values_list(
+        'id', flat=True))
+    missing_products = inaccessible_products(importer, product_ids)
+    prices = {pk: (price, discount) for pk, price, discount in Product.objects.filter(
+        id__in=product_ids - missing_products).values_list('id', 'price', 'discount')}
+
+    valid = []
+    for bill in batch:
+        errors = bill['errors']
+        if bill['user'] is not None and bill['user'] not in tenants:
+            errors.append('user is not available')
+        for product_id, seller_id, number in bill['items']:
+            if product_id in missing_products:
+                errors.append('product {} is not available'.format(product_id))
+            if seller_id is not None and seller_id not in sellers:
+                errors.append('seller {} is not available'.format(seller_id))
+        if errors:
+            result.error(bill['line'], bill['key'], errors)
+        else:
+            bill['tenant'] = tenants[bill['user']]
+            bill['items'] = [(product_id, seller_id, number) + prices[product_id]
+                             for product_id, seller_id, number in bill['items']]
+            valid.append(bill)
+    return valid
+
+
+def bill_totals(bill):
+    total = sum(line_total(price, discount, number)
+                for product_id, seller_id, number, price, discount in bill['items'])
+    gross = sum(price*number for product_id, seller_id,
+                number, price, discount in bill['items'])
+    return {'total': total, 'discount_total': gross-total,
+            'balance': total - sum(bill[name] for name in AMOUNT_FIELDS)}
+
+
+def fitting_bills(batch, result, using):
+    # bills are served in file order from the locked stock, the ones it can not cover are reported
+    stock = locked_inventory({item[0] for bill in batch for item in bill['items']}, using)
+    fitting = []
+    for bill in batch:
+        wanted = Counter()
+        for product_id, seller_id, number, price, discount in bill['items']:
+            wanted[product_id] += number
+        shortfalls = shortfalls_of(wanted, stock)
+        if shortfalls:
+            result.error(bill['line'], bill['key'], InsufficientInventory(shortfalls).messages())
+            continue
+        stock.update((product_id, stock[product_id]-number) for product_id, number in wanted.items())
+        fitting.append(bill)
+    return fitting
+
+
+def insert_batch(importer, batch, result, using):
+    with transaction.atomic(using=using):
+        batch = fitting_bills(batch, result, using)
+        if batch:
+            insert_bills(importer, batch, result, using)
+
+
+def insert_bills(importer, batch, result, using):
+    bills = [Bill(user_id=bill['user'], creator=importer, tenant_id=bill['tenant'], code='',
+                  description=bill['description'], delivery_date=bill['delivery_date'],
+                  **{name: bill[name] for name in AMOUNT_FIELDS}, **bill_totals(bill)) for bill in batch]
+    now = datetime.now()
+    with transaction.atomic(using=using):
+        if can_allocate_ids(using):
+            # codes come from ids taken from the sequence, so each bill is written once
+            for bill, pk in zip(bills, allocate_ids(Bill, len(bills), using)):
+                bill.id, bill.code = pk, format_bill_code(pk, now)
+            Bill.objects.using(using).bulk_create(bills)
+        else:
+            Bill.objects.using(using).bulk_create(bills)
+            for bill in bills:
+                bill.code = format_bill_code(bill.id, now)
+            Bill.objects.using(using).bulk_update(bills, ['code'])
+        items = BillProduct.objects.using(using).bulk_create([
+            BillProduct(bill=bill, product_id=product_id, seller_id=seller_id, number=number, unit_price=price,
+                        discount=discount, line_total=line_total(price, discount, number))
+            for bill, data in zip(bills, batch) for product_id, seller_id, number, price, discount in data['items']])
+        reserve([(item[0], item[2]) for data in batch for item in data['items']], using)
+        bill_ids = [bill.id for bill in bills]
+        transaction.on_commit(lambda: send_bill_creation_notification.delay(bill_ids), using=using)
+    result.bills += len(bills)
+    result.line_items += len(items)
+    result.tenant_ids.update(bill['tenant'] for bill in batch)
+    result.customer_ids.update(bill['user'] for bill in batch)
+    result.days.update(timezone.localdate(bill.date_created) for bill in bills)
+
+
+def import_bills(stream, file_type, importer, batch_size=BATCH_SIZE, progress=None):
+    result = ImportResult(importer.id)
+    using = router.db_for_write(Bill)
+    batch = []
+
+    def flush():
+        valid = validate_batch(importer, batch, result)
+        if valid:
+            insert_batch(importer, valid, result, using)
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for bill in pending_bills(read_rows(stream, file_type), result):
+        batch.append(bill)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if result.bills:
+        bills_imported.send(sender=Bill, tenant_ids=result.tenant_ids,
+                            user_ids=result.customer_ids, days=result.days)
+    return result
+
+
+def import_file(path, file_type, importer, **kwargs):
+    with default_storage.open(path, 'rb') as file:
+        return import_bills(io.TextIOWrapper(file, encoding='utf-8-sig'), file_type, importer, **kwargs)
@@ -0,0 +1,108 @@
+from collections import Counter
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from crm import response_cache
+from .models import Product
+
+# rows are locked in id order so concurrent bills sharing products queue up instead of deadlocking,
+# the update only runs when every line is covered
+RESERVE_SQL = '''
+WITH wanted (id, quantity) AS (VALUES {values}),
+locked AS (
+    SELECT p.id, p.inventory, wanted.quantity FROM {table} p JOIN wanted ON wanted.id = p.id
+    ORDER BY p.id FOR UPDATE OF p
+),
+updated AS (
+    UPDATE {table} p SET inventory = p.inventory - locked.quantity, date_modified = %s
+    FROM locked WHERE p.id = locked.id AND (SELECT count(*) FROM locked) = %s AND NOT EXISTS (
+        SELECT 1 FROM locked WHERE locked.inventory < locked.quantity)
+    RETURNING p.id, p.user_id, p.tenant_id
+)
+SELECT locked.id, locked.inventory, updated.user_id, updated.tenant_id, updated.id IS NOT NULL
+FROM locked LEFT JOIN updated ON updated.id = locked.id
+'''
+
+
+class InsufficientInventory(Exception):
+    def __init__(self, shortfalls):
+        super().__init__('not enough inventory for products {}'.format(
+            ', '.join(map(str, sorted(shortfalls)))))
+        self.shortfalls = shortfalls
+
+    def messages(self):
+        return ['product {} has {} left, {} requested'.format(product_id, shortfall['available'], shortfall['requested'])
+                for product_id, shortfall in sorted(self.shortfalls.items())]
+
+
+class InventoryBusy(Exception):
+    pass
+
+
+def shortfalls_of(wanted, available):
+    return {product_id: {'requested': quantity, 'available': available.get(product_id, 0)}
+            for product_id, quantity in wanted.items() if available.get(product_id, 0) < quantity}
+
+
+def reserve_postgresql(wanted, using):
+    connection = connections[using]
+    values = ', '.join(['(%s::bigint, %s::integer)'] * len(wanted))
+    params = [value for line in sorted(wanted.items()) for value in line]
+    lock_timeout = settings.INVENTORY_LOCK_TIMEOUT
+    # a savepoint keeps the lock timeout local and lets a timed out reservation be retried or reported
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if lock_timeout:
+            cursor.execute("SELECT current_setting('lock_timeout'), set_config('lock_timeout', %s, true)", [
+                           '{}ms'.format(lock_timeout)])
+            previous = cursor.fetchone()[0]
+        cursor.execute(RESERVE_SQL.format(values=values, table=connection.ops.quote_name(
+            Product._meta.db_table)), params + [timezone.now(), len(wanted)])
+        rows = cursor.fetchall()
+        if lock_timeout:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [previous])
+    if rows and all(row[4] for row in rows) and len(rows) == len(wanted):
+        return {owner for row in rows for owner in row[2:4]}
+    raise InsufficientInventory(shortfalls_of(wanted, {row[0]: row[1] for row in rows}))
+
+
+def reserve_generic(wanted, using):
+    products = Product.objects.using(using)
+    with transaction.atomic(using=using):
+        for product_id, quantity in sorted(wanted.items()):
+            if not products.filter(pk=product_id, inventory__gte=quantity).update(
+                    inventory=F('inventory')-quantity, date_modified=timezone.now()):
+                # undo the lines decremented so far, then report every line
+                transaction.set_rollback(True, using=using)
+                break
+        else:
+            return {owner for row in products.filter(pk__in=wanted).values_list('user', 'tenant') for owner in row}
+    raise InsufficientInventory(shortfalls_of(wanted, dict(
+        products.filter(pk__in=wanted).values_list('id', 'inventory'))))
+
+
+def locked_inventory(product_ids, using):
+    # same id order as the reservation, so imports and bills queue up on the rows instead of deadlocking
+    return dict(Product.objects.using(using).select_for_update().filter(
+        pk__in=product_ids).order_by('pk').values_list('id', 'inventory'))
+
+
+def reserve(lines, using=None):
+    # takes every (product_id, quantity) line out of the inventory or none of them
+    wanted = Counter()
+    for product_id, quantity in lines:
+        if quantity > 0:
+            wanted[product_id] += quantity
+    if not wanted:
+        return
+    using = using or router.db_for_write(Product)
+    try:
+        if connections[using].vendor == 'postgresql':
+            owners = reserve_postgresql(wanted, using)
+        else:
+            owners = reserve_generic(wanted, using)
+    except OperationalError as error:
+        if getattr(error.__cause__, 'pgcode', None) == '55P03':
+            raise InventoryBusy('products are locked by other bills, try again') from error
+        raise
+    response_cache.refresh('products', owners)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.models import User
+from bills.imports import BATCH_SIZE, FILE_TYPES, import_bills
+
+
+class Command(BaseCommand):
+    help = 'Import bills and their line items from a csv or json lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', type=int, required=True,
+                            help='id of the admin who creates the bills')
+        parser.add_argument('--file-type', choices=FILE_TYPES,
+                            help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        file_type = options['file_type'] or options['path'].rsplit('.', 1)[-1].lower()
+        if file_type not in FILE_TYPES:
+            raise CommandError('unknown file type {}'.format(file_type))
+        importer = User.objects.filter(pk=options['user']).first()
+        if importer is None:
+            raise CommandError('user {} does not exist'.format(options['user']))
+
+        def progress(result):
+            self.stdout.write('{} rows, {} bills imported, {} errors'.format(
+                result.rows, result.bills, result.error_count))
+        with open(options['path'], encoding='utf-8-sig', newline='') as file:
+            result = import_bills(file, file_type, importer,
+                                  batch_size=options['batch_size'], progress=progress)
+        for error in result.errors:
+            self.stderr.write('line {line} bill {bill}: {errors}'.format(**error))
+        self.stdout.write(self.style.SUCCESS('imported {} bills with {} line items'.format(
+            result.bills, result.line_items)))
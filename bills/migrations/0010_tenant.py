@@ -0,0 +1,47 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def fill_tenants(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Category = apps.get_model('bills', 'Category')
+    for label in ['bills.Bill', 'users.Ticket', 'users.Turn', 'users.UserImage']:
+        apps.get_model(label).objects.update(tenant_id=Subquery(
+            User.objects.filter(pk=OuterRef('user_id')).values('admin_id')[:1]))
+    apps.get_model('bills', 'Product').objects.update(tenant_id=Subquery(
+        Category.objects.filter(pk=OuterRef('category_id')).values('user_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bills', '0009_composite_indexes'),
+        ('users', '0026_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='tenant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='tenant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['tenant', 'date_created'], name='bills_bill_tenant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'date_created'], name='bills_product_tenant_date_idx'),
+        ),
+        migrations.RunPython(fill_tenants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Category = apps.get_model('bills', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent'))
+    paths = {}
+    for pk in parents:
+        chain = []
+        while pk is not None and pk not in paths:
+            if pk in chain:
+                raise ValueError('category {} is its own ancestor'.format(pk))
+            chain.append(pk)
+            pk = parents[pk]
+        for node in reversed(chain):
+            parent = parents[node]
+            paths[node] = '/' if parent is None else '{}{}/'.format(paths[parent], parent)
+    Category.objects.bulk_update([Category(pk=pk, path=path, depth=path.count('/')-1) for pk, path in paths.items()],
+                                 ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0010_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='/', editable=False, max_length=1000),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='bills_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
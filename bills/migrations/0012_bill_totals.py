@@ -0,0 +1,70 @@
+# Generated by Django 4.0.6 on 2026-10-18 23:40
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    Product = apps.get_model('bills', 'Product')
+    BillProduct = apps.get_model('bills', 'BillProduct')
+    Bill = apps.get_model('bills', 'Bill')
+    # the current product prices are the best snapshot there is for existing lines
+    products = Product.objects.filter(pk=OuterRef('product_id'))
+    BillProduct.objects.update(unit_price=Subquery(products.values('price')[:1]),
+                               discount=Subquery(products.values('discount')[:1]))
+    gross = F('unit_price')*F('number')
+    BillProduct.objects.update(line_total=gross - gross*F('discount')/100)
+
+    lines = BillProduct.objects.filter(bill=OuterRef('pk')).order_by().values('bill')
+    total = Coalesce(Subquery(lines.annotate(value=Sum('line_total')).values('value')), 0,
+                     output_field=BigIntegerField())
+    gross_total = Coalesce(Subquery(lines.annotate(value=Sum(gross, output_field=BigIntegerField())).values('value')), 0,
+                           output_field=BigIntegerField())
+    Bill.objects.update(total=total, discount_total=gross_total-total,
+                        balance=total-F('cash_payment')-F('used_credit')-F('debt'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0011_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='balance',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='discount_total',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='total',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='billproduct',
+            name='discount',
+            field=models.PositiveIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(100)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='billproduct',
+            name='line_total',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='billproduct',
+            name='unit_price',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
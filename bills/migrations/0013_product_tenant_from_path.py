@@ -0,0 +1,30 @@
+# Generated by Django 4.0.6 on 2026-10-19 10:12
+
+from collections import defaultdict
+from django.db import migrations
+
+
+def fill_product_tenants(apps, schema_editor):
+    Category = apps.get_model('bills', 'Category')
+    Product = apps.get_model('bills', 'Product')
+    # parents come before their children, an unowned category takes its parent's owner
+    owners = {}
+    for pk, parent_id, user_id in Category.objects.order_by('depth').values_list('pk', 'parent', 'user'):
+        owners[pk] = user_id if user_id is not None else owners.get(parent_id)
+    categories = defaultdict(list)
+    for pk, tenant_id in owners.items():
+        categories[tenant_id].append(pk)
+    for tenant_id, category_ids in categories.items():
+        Product.objects.filter(category__in=category_ids).exclude(
+            tenant_id=tenant_id).update(tenant_id=tenant_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0012_bill_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_product_tenants, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,8 @@
-from django.db import models
-import datetime
-import jdatetime
-from django.utils.translation import gettext as _
+from django.db import models, router
+from crm.dates import date_time
 from django.core.validators import MaxValueValidator
+from .codes import allocate_ids, can_allocate_ids, format_bill_code
+from .categories import ROOT_PATH, child_path, move_subtree, place, subtree_prefix
 
 
 class Category(models.Model):
@@ -11,19 +11,44 @@ class Category(models.Model):
         'users.User', models.CASCADE, related_name='categories', null=True, blank=True)
     parent = models.ForeignKey(
         'self', models.CASCADE, related_name='child', null=True, blank=True)
+    path = models.CharField(max_length=1000, default=ROOT_PATH, editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['user', 'date_created'],
+                         name='bills_category_user_date_idx'),
+            models.Index(fields=['path'], name='bills_category_path_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if not {'parent', 'parent_id'} & set(update_fields):
+                return super().save(*args, **kwargs)
+            kwargs['update_fields'] = set(update_fields) | {'path', 'depth'}
+        old = None
+        if not self._state.adding:
+            old = type(self)._default_manager.filter(
+                pk=self.pk).values_list('path', 'depth').first()
+        place(self)
+        super().save(*args, **kwargs)
+        if old and old[0] != self.path:
+            # the descendants keep their place under this category
+            move_subtree(type(self), subtree_prefix(old[0], self.pk),
+                         child_path(self), self.depth-old[1])
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
 
 class Product(models.Model):
@@ -37,19 +62,29 @@ class Product(models.Model):
     last_price = models.BigIntegerField()
     category = models.ForeignKey(
         Category, models.CASCADE, related_name='products')
+    tenant = models.ForeignKey(
+        'users.User', models.CASCADE, related_name='+', null=True, blank=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['user', 'date_created'],
+                         name='bills_product_user_date_idx'),
+            models.Index(fields=['category', 'date_created'],
+                         name='bills_product_cat_date_idx'),
+            models.Index(fields=['tenant', 'date_created'],
+                         name='bills_product_tenant_date_idx'),
+        ]
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
 
 class Bill(models.Model):
@@ -63,24 +98,65 @@ class Bill(models.Model):
     code = models.CharField(max_length=100)
     creator = models.ForeignKey(
         'users.User', models.CASCADE, related_name='bills')
+    tenant = models.ForeignKey(
+        'users.User', models.CASCADE, related_name='+', null=True, blank=True, editable=False)
     products = models.ManyToManyField('Product', through='BillProduct')
+    # total is what the line items are worth after discounts, balance is the part not covered by payments
+    total = models.BigIntegerField(default=0, editable=False)
+    discount_total = models.BigIntegerField(default=0, editable=False)
+    balance = models.BigIntegerField(default=0, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['user', 'date_created'],
+                         name='bills_bill_user_date_idx'),
+            models.Index(fields=['tenant', 'date_created'],
+                         name='bills_bill_tenant_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # kept to move the daily statistics when the bill changes hands
+        if 'tenant_id' in instance.__dict__ and 'user_id' in instance.__dict__:
+            instance._loaded_owners = (instance.tenant_id, instance.user_id)
+        return instance
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
+
+    def save(self, *args, **kwargs):
+        self.balance = int(self.total) - int(self.cash_payment) - \
+            int(self.used_credit) - int(self.debt)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'total', 'cash_payment', 'used_credit', 'debt'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'balance'}
+        if not(self._state.adding and self.pk is None and not self.code):
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        if can_allocate_ids(using):
+            # take the id from the sequence so the code is stored by the insert itself
+            self.id = allocate_ids(type(self), 1, using)[0]
+            self.code = format_bill_code(self.id)
+            kwargs['force_insert'] = True
+            return super().save(*args, **kwargs)
+        super().save(*args, **kwargs)
+        self.code = format_bill_code(self.id)
+        type(self)._default_manager.using(using).filter(
+            pk=self.pk).update(code=self.code)
 
     @property
     def delivery_date_time(self):
-        return datetime.datetime.strftime(self.delivery_date, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.delivery_date).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.delivery_date)
 
 
 class BillProduct(models.Model):
@@ -90,3 +166,8 @@ class BillProduct(models.Model):
     product = models.ForeignKey(
         'Product', models.CASCADE, related_name='sells')
     number = models.IntegerField(default=1)
+    # price and discount of the product when it was sold, filled from the product when left empty
+    unit_price = models.BigIntegerField()
+    discount = models.PositiveIntegerField(
+        validators=[MaxValueValidator(100)])
+    line_total = models.BigIntegerField()
@@ -1,4 +1,12 @@
 from rest_framework.permissions import BasePermission
+from .categories import is_owned_by
+
+
+def owner_admin_id(product):
+    # the product viewset annotates it, other callers load the owner
+    if hasattr(product, 'user_admin_id'):
+        return product.user_admin_id
+    return product.user.admin_id if product.user_id else None
 
 
 class BillViewPermission(BasePermission):
@@ -11,7 +19,7 @@ class BillRetrievePermission(BasePermission):
         return request.user.has_perm('bills.view_bill')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user.admin or request.user.admin == obj.user.admin != None)
+        return (request.user.id == obj.tenant_id or request.user.admin_id == obj.tenant_id != None)
 
 
 class BillAddPermission(BasePermission):
@@ -24,7 +32,7 @@ class BillChangePermission(BasePermission):
         return request.user.has_perm('bills.change_bill')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user.admin or request.user.admin == obj.user.admin != None)
+        return (request.user.id == obj.tenant_id or request.user.admin_id == obj.tenant_id != None)
 
 
 class BillRemovePermission(BasePermission):
@@ -32,7 +40,7 @@ class BillRemovePermission(BasePermission):
         return request.user.has_perm('bills.delete_bill')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user.admin or request.user.admin == obj.user.admin != None)
+        return (request.user.id == obj.tenant_id or request.user.admin_id == obj.tenant_id != None)
 
 
 class CategoryViewPermission(BasePermission):
@@ -45,7 +53,7 @@ class CategoryRetrievePermission(BasePermission):
         return request.user.has_perm('bills.view_category')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user or request.user.admin == obj.user != None)
+        return is_owned_by(obj, request.user.id, request.user.admin_id)
 
 
 class CategoryAddPermission(BasePermission):
@@ -58,7 +66,7 @@ class CategoryChangePermission(BasePermission):
         return request.user.has_perm('bills.change_category')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user or request.user.admin == obj.user != None)
+        return is_owned_by(obj, request.user.id, request.user.admin_id)
 
 
 class CategoryRemovePermission(BasePermission):
@@ -66,7 +74,7 @@ class CategoryRemovePermission(BasePermission):
         return request.user.has_perm('bills.delete_category')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user or (request.user.admin == obj.user != None))
+        return is_owned_by(obj, request.user.id, request.user.admin_id)
 
 
 class ProductViewPermission(BasePermission):
@@ -79,7 +87,7 @@ class ProductRetrievePermission(BasePermission):
         return request.user.has_perm('bills.view_product')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user) or (request.user == obj.category.user)
+        return (request.user.id == obj.user_id) or (request.user.id == obj.tenant_id)
 
 
 class ProductAddPermission(BasePermission):
@@ -92,7 +100,7 @@ class ProductChangePermission(BasePermission):
         return request.user.has_perm('bills.change_product')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user) or (request.user == obj.category.user) or (request.user.admin == obj.user.admin != None) or (request.user.admin == obj.category.user)
+        return (request.user.id == obj.user_id) or (request.user.id == obj.tenant_id) or (request.user.admin_id == obj.tenant_id) or (request.user.admin_id == owner_admin_id(obj) != None)
 
 
 class ProductRemovePermission(BasePermission):
@@ -100,4 +108,4 @@ class ProductRemovePermission(BasePermission):
         return request.user.has_perm('bills.delete_product')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user) or (request.user == obj.category.user) or (request.user.admin == obj.user.admin != None) or (request.user.admin == obj.category.user)
+        return (request.user.id == obj.user_id) or (request.user.id == obj.tenant_id) or (request.user.admin_id == obj.tenant_id) or (request.user.admin_id == owner_admin_id(obj) != None)
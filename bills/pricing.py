@@ -0,0 +1,49 @@
+from django.db.models import BigIntegerField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from crm import response_cache
+from .models import Bill, BillProduct, Product
+
+
+def line_total(unit_price, discount, number):
+    gross = unit_price * number
+    return gross - gross * discount // 100
+
+
+def price_line(item, price, discount):
+    if item.unit_price is None:
+        item.unit_price = price
+    if item.discount is None:
+        item.discount = discount
+    item.line_total = line_total(item.unit_price, item.discount, item.number)
+    return item
+
+
+def price_lines(items):
+    # one query for the prices of every product on the lines
+    prices = dict((pk, (price, discount)) for pk, price, discount in Product.objects.filter(
+        pk__in={item.product_id for item in items}).values_list('id', 'price', 'discount'))
+    return [price_line(item, *prices[item.product_id]) for item in items]
+
+
+def totals_expressions(model=BillProduct):
+    lines = model._default_manager.filter(
+        bill=OuterRef('pk')).order_by().values('bill')
+    total = Coalesce(Subquery(lines.annotate(value=Sum('line_total')).values('value')), 0,
+                     output_field=BigIntegerField())
+    gross = Coalesce(Subquery(lines.annotate(value=Sum(F('unit_price')*F('number'), output_field=BigIntegerField())).values('value')), 0,
+                     output_field=BigIntegerField())
+    return {'total': total, 'discount_total': gross-total,
+            'balance': total-F('cash_payment')-F('used_credit')-F('debt')}
+
+
+def recalculate(bill_ids):
+    bills = Bill.objects.filter(pk__in=bill_ids)
+    before = dict(bills.values_list('id', 'total'))
+    # listed bills are validated by date_modified and the bills scope, both have to move
+    bills.update(**totals_expressions(), date_modified=timezone.now())
+    rows = list(bills.values_list('id', 'tenant', 'date_created', 'total'))
+    response_cache.refresh('bills', {tenant_id for pk, tenant_id, date_created, total in rows})
+    return [(pk, tenant_id, date_created, total-before[pk]) for pk, tenant_id, date_created, total in rows
+            if total != before[pk]]
+
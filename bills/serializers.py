@@ -2,12 +2,29 @@ from rest_framework import serializers
 from .models import *
 from users.models import User
 from django.db.models import Q
+from django.db import transaction
+from .access import inaccessible_products
+from .inventory import reserve
+from .pricing import price_lines
+from .signals import refresh_bill_totals
+from .categories import parse_path
+from crm.fields import DateTimeDisplayField, DateTimeListSerializer
 
 
 class CategorySerializer(serializers.ModelSerializer):
+    create_date_time = DateTimeDisplayField(source='date_created')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
+
     class Meta:
         model = Category
         exclude = ['user']
+        list_serializer_class = DateTimeListSerializer
+
+    def validate_parent(self, value):
+        if value and self.instance and (value.pk == self.instance.pk or self.instance.pk in parse_path(value.path)):
+            raise serializers.ValidationError(
+                'category can not be moved under itself')
+        return value
 
     def create(self, validated_data, user):
         category = Category(**validated_data)
@@ -18,10 +35,13 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer()
+    create_date_time = DateTimeDisplayField(source='date_created')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
 
     class Meta:
         model = Product
         fields = '__all__'
+        list_serializer_class = DateTimeListSerializer
 
 
 class ProductFormSerializer(serializers.ModelSerializer):
@@ -43,10 +63,14 @@ class ProductFormSerializer(serializers.ModelSerializer):
 
 class BillSerializer(serializers.ModelSerializer):
     products = ProductSerializer(many=True)
+    create_date_time = DateTimeDisplayField(source='date_created')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
+    delivery_date_time = DateTimeDisplayField(source='delivery_date')
 
     class Meta:
         model = Bill
         fields = '__all__'
+        list_serializer_class = DateTimeListSerializer
 
 
 class BillFormSerializer(serializers.ModelSerializer):
@@ -56,16 +80,10 @@ class BillFormSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data, creator):
         admin_info = self.context['request'].user
-        validated_data = validated_data.copy()
-        products_data = None
-        if 'products' in validated_data:
-            products_data = validated_data['products']
-            validated_data.pop('products')
-        user = User.objects.get(pk=validated_data['user'])
-        validated_data.pop('user')
+        validated_data = dict(validated_data)
+        products_data = validated_data.pop('products', None)
 
         bill = Bill(**validated_data)
-        bill.user = user
         # for idx in validated_data:
         #     if idx == 'user':
         #         bill.user = User.objects.get(pk=validated_data['user'])
@@ -77,38 +95,33 @@ class BillFormSerializer(serializers.ModelSerializer):
         #         setattr(bill, idx, validated_data[idx])
         # print(idx, validated_data[idx])
         bill.creator = creator
-        bill.save()
-        if products_data:
-            products_id = list(map(
-                lambda x: int(x['product']), products_data))
-            numbers = list(map(lambda x: int(x['number']),
-                               products_data))
-            sellers_id = list(map(lambda x: int(
-                x['seller']), products_data))
-            sellers = User.objects.filter(
-                id__in=sellers_id, admin=bill.creator)
-            products = Product.objects.filter(id__in=products_id)
-            c_products = products.count()
-            c_sellers = sellers.count()
-            c_numbers = len(numbers)
-            # check products and sellers belongs to admin
-            access_products = Product.objects.filter(Q(category__user=admin_info)
-                                                     | Q(category__parent__user=admin_info)
-                                                     | Q(category__parent__parent__user=admin_info)
-                                                     | Q(user=admin_info)
-                                                     ).values('id')
-            set_access_products = set(map(lambda x: x['id'], access_products))
-            access_sellers = User.objects.filter(
-                admin=admin_info, groups__name='employee_user').values('id')
-            set_access_sellers = set(map(lambda x: x['id'], access_sellers))
-            if (c_numbers == c_products == c_sellers) and (len(set(products_id)-set_access_products) == 0) and (len(set(sellers_id)-set_access_sellers) == 0):
-                for i in range(c_numbers):
-                    bill.products.add(products[i], through_defaults={
-                        'number': numbers[i], 'seller': sellers[i]})
+        with transaction.atomic():
+            bill.save()
+            items = self.add_products(
+                bill, products_data, admin_info) if products_data else []
+            refresh_bill_totals([bill.id])
+            bill.refresh_from_db(fields=['total', 'discount_total', 'balance'])
+            # the product rows stay locked until commit, so this comes last
+            reserve([(item.product_id, item.number) for item in items])
 
         return bill
 
+    def add_products(self, bill, products_data, admin_info):
+        lines = [(int(x['product']), int(x['seller']), int(x['number']))
+                 for x in products_data]
+        products_id = set(line[0] for line in lines)
+        sellers_id = set(line[1] for line in lines)
+        # check products and sellers belongs to admin
+        access_sellers = set(User.objects.filter(id__in=sellers_id, admin=bill.creator).filter(
+            admin=admin_info, groups__name='employee_user').values_list('id', flat=True))
+        if inaccessible_products(admin_info, products_id) or sellers_id - access_sellers:
+            return []
+        return BillProduct.objects.bulk_create(price_lines([
+            BillProduct(bill=bill, product_id=product_id,
+                        seller_id=seller_id, number=number)
+            for product_id, seller_id, number in lines]))
+
     def validate_user(self, value):
-        if self.context['request'].user != value.admin and self.context['request'].user.admin != value.admin:
+        if self.context['request'].user.id != value.admin_id and self.context['request'].user.admin_id != value.admin_id:
             raise serializers.ValidationError('user is not available')
         return value
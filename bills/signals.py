@@ -1,19 +1,156 @@
+import threading
 from django.dispatch import Signal, receiver
-from django.db.models.signals import post_save
-from .models import Bill
-from datetime import datetime
+from django.db.models.signals import post_delete, post_save, pre_save, pre_delete
+from django.db import transaction
+from .models import Bill, BillProduct, Category, Product
+from .access import category_owners, invalidate_product_access
+from .pricing import price_line, recalculate
+from users.tenancy import user_tenant_id, product_tenant_id, needs_tenant, move_category_products
 from .tasks import send_bill_creation_notification
+from users.notifications import notify_on_commit
+from crm import response_cache
 
+bills_imported = Signal()
+bill_totals_changed = Signal()
+# bills whose totals are settled by a delete in progress, their lines skip the refresh
+deleting = threading.local()
 
-@receiver(post_save, sender=Bill)
-def set_bill_code(sender, **kwargs):
-    current_id = kwargs['instance'].id
-    if kwargs['created']:
-        kwargs['instance'].code = 'vafa_{0}_{1}'.format(
-            current_id, datetime.now().strftime('%Y%m%d%H%M%S'))
-        kwargs['instance'].save()
+
+@receiver(pre_save, sender=Bill)
+def set_bill_tenant(sender, **kwargs):
+    if needs_tenant(kwargs, 'user', 'user_id'):
+        kwargs['instance'].tenant_id = user_tenant_id(kwargs['instance'])
 
 
 @receiver(post_save, sender=Bill)
 def send_bill_creation(sender, **kwargs):
-    send_bill_creation_notification(kwargs['instance'])
+    if kwargs['created'] and not kwargs.get('raw'):
+        notify_on_commit(send_bill_creation_notification,
+                         kwargs['instance'].pk)
+
+
+def refresh_bill_totals(bill_ids):
+    changes = recalculate(bill_ids)
+    if changes:
+        bill_totals_changed.send(sender=Bill, changes=changes)
+
+
+@receiver(pre_save, sender=BillProduct)
+def price_bill_product(sender, **kwargs):
+    instance = kwargs['instance']
+    if kwargs.get('raw'):
+        return
+    if instance.unit_price is None or instance.discount is None:
+        price_line(instance, *Product.objects.filter(pk=instance.product_id).values_list(
+            'price', 'discount').get())
+    else:
+        price_line(instance, instance.unit_price, instance.discount)
+
+
+@receiver(post_save, sender=BillProduct)
+def bill_product_saved(sender, **kwargs):
+    if not kwargs.get('raw'):
+        refresh_bill_totals([kwargs['instance'].bill_id])
+
+
+def deleting_bills(name):
+    if not hasattr(deleting, name):
+        setattr(deleting, name, set())
+    return getattr(deleting, name)
+
+
+@receiver(post_delete, sender=BillProduct)
+def bill_product_deleted(sender, **kwargs):
+    bill_id = kwargs['instance'].bill_id
+    if bill_id not in deleting_bills('bills') and bill_id not in deleting_bills('products'):
+        refresh_bill_totals([bill_id])
+
+
+@receiver(pre_delete, sender=Bill)
+def remember_deleted_bill(sender, **kwargs):
+    deleting_bills('bills').add(kwargs['instance'].pk)
+
+
+@receiver(post_delete, sender=Bill)
+def bill_deleted(sender, **kwargs):
+    instance = kwargs['instance']
+    deleting_bills('bills').discard(instance.pk)
+    if instance.total:
+        bill_totals_changed.send(sender=Bill, changes=[
+            (instance.pk, instance.tenant_id, instance.date_created, -instance.total)])
+
+
+def product_owners(product_id):
+    owners = Product.objects.filter(pk=product_id).values_list(
+        'user', 'category').first()
+    return {owners[0]} | category_owners(owners[1]) if owners else set()
+
+
+def invalidate_owners(owners, scopes):
+    invalidate_product_access(owners)
+    for scope in scopes:
+        response_cache.bump(scope, owners)
+
+
+def refresh_product_access(owners, scopes=('products',)):
+    invalidate_owners(owners, scopes)
+    transaction.on_commit(lambda: invalidate_owners(owners, scopes))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_owners(sender, **kwargs):
+    instance = kwargs['instance']
+    instance._access_owners = product_owners(
+        instance.pk) if instance.pk else set()
+
+
+@receiver(pre_save, sender=Product)
+def set_product_tenant(sender, **kwargs):
+    if needs_tenant(kwargs, 'category', 'category_id'):
+        kwargs['instance'].tenant_id = product_tenant_id(kwargs['instance'])
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, **kwargs):
+    instance = kwargs['instance']
+    refresh_product_access(getattr(instance, '_access_owners', set()) | {
+                           instance.user_id} | category_owners(instance.category_id))
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleted(sender, **kwargs):
+    instance = kwargs['instance']
+    refresh_product_access(product_owners(instance.pk))
+    # the cascaded lines are refreshed together once the product is gone
+    instance._bill_ids = set(BillProduct.objects.filter(
+        product=instance.pk).values_list('bill', flat=True))
+    deleting_bills('products').update(instance._bill_ids)
+
+
+@receiver(post_delete, sender=Product)
+def product_lines_deleted(sender, **kwargs):
+    bill_ids = getattr(kwargs['instance'], '_bill_ids', set())
+    deleting_bills('products').difference_update(bill_ids)
+    refresh_bill_totals(bill_ids - deleting_bills('bills'))
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_owners(sender, **kwargs):
+    instance = kwargs['instance']
+    instance._access_owners = category_owners(
+        instance.pk) if instance.pk else set()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, **kwargs):
+    instance = kwargs['instance']
+    if not kwargs['created'] and needs_tenant(kwargs, 'user', 'user_id', 'parent', 'parent_id'):
+        move_category_products(instance)
+    refresh_product_access(getattr(instance, '_access_owners', set()) | {
+                           instance.user_id} | category_owners(instance.parent_id), ('products', 'categories'))
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, **kwargs):
+    refresh_product_access(category_owners(
+        kwargs['instance'].pk), ('products', 'categories'))
@@ -1,8 +1,24 @@
 from celery import shared_task
-from users.models import Notification
+from django.core.files.storage import default_storage
+from users.models import Notification, User
+from .models import Bill
 
 
 @shared_task()
-def send_bill_creation_notification(bill):
+def send_bill_creation_notification(bills_id):
     message_text = 'your bill created successfully.thank you for.'
-    Notification.objects.create(text=message_text, user=bill.user)
+    Notification.objects.bulk_create([
+        Notification(text=message_text, user_id=user_id)
+        for user_id in Bill.objects.filter(id__in=bills_id).values_list('user', flat=True)])
+
+
+@shared_task(bind=True, name='import_bills')
+def import_bills_file(self, path, file_type, user_id):
+    from .imports import import_file
+
+    def progress(result):
+        self.update_state(state='PROGRESS', meta=result.as_dict())
+    try:
+        return import_file(path, file_type, User.objects.get(pk=user_id), progress=progress).as_dict()
+    finally:
+        default_storage.delete(path)
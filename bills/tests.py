@@ -1,9 +1,36 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+import threading
+import csv
+import datetime
+import io
+import json
 from rest_framework.test import APITestCase
 from users.models import User
 from django.contrib.auth.models import Group, Permission
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Bill, Category, Product
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .models import Bill, BillProduct, Category, Product
+from .access import inaccessible_products
+from users.models import Ticket
+from users.tenancy import backfill_tenants
+from crm import response_cache
+from unittest import mock
+from crm.dates import date_time
+from django.core.management import call_command
+import tempfile
+from django.test import override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from statInfo.models import DailyStatistic
+from .imports import import_bills
+from .inventory import InsufficientInventory, InventoryBusy, reserve
+from .pricing import recalculate
+from django.db import transaction
+from .tasks import import_bills_file
+from importlib import import_module
+from django.apps import apps
+from .categories import ancestors, descendants, is_owned_by, rebuild_paths, subtree_products
 
 
 class UrlTest(APITestCase):
@@ -259,3 +286,924 @@ class UrlTest(APITestCase):
             'category': category.id,
         }, format='json')
         self.assertEqual(r_product_add.status_code, 403)
+
+
+class BillQueryCountTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_bill', 'add_bill', 'change_bill', 'delete_bill']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_employee = User.objects.create(
+            username='u_employee', password='Mrb76420', admin=self.u_admin)
+        self.u_employee.groups.add(
+            Group.objects.create(name='employee_user'))
+        self.u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        self.categories = [Category.objects.create(
+            name='test_'+str(i), user=self.u_admin) for i in range(3)]
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def _create_bills(self, count):
+        for i in range(count):
+            bill = Bill.objects.create(
+                cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+            for category in self.categories:
+                product = Product.objects.create(
+                    name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=category)
+                BillProduct.objects.create(
+                    bill=bill, product=product, seller=self.u_employee)
+
+    def _list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            r_bills = self.client.get('/api/bills/bills/', format='json')
+        self.assertEqual(r_bills.status_code, 200)
+        return len(queries), r_bills.data
+
+    def test_bill_list_query_count_is_constant(self):
+        self._create_bills(1)
+        # the first request fills the permission cache
+        self._list_queries()
+        few_queries, data = self._list_queries()
+        self._create_bills(9)
+        many_queries, data = self._list_queries()
+        self.assertEqual(data['count'], 10)
+        self.assertEqual(len(data['results'][-1]['products']), 3)
+        self.assertEqual(many_queries, few_queries)
+
+    def test_bill_list_shows_jalali_dates(self):
+        self._create_bills(2)
+        queries, data = self._list_queries()
+        bill = Bill.objects.get(pk=data['results'][0]['id'])
+        self.assertEqual(data['results'][0]['create_date_time'],
+                         bill.create_date_time)
+        self.assertEqual(data['results'][0]['products'][0]['create_date_time'],
+                         bill.products.all()[0].create_date_time)
+
+    def test_bill_list_renders_dates_from_the_page_batch(self):
+        self._create_bills(2)
+        with mock.patch('crm.fields.date_time', wraps=date_time) as single:
+            queries, data = self._list_queries()
+        self.assertFalse(single.called)
+        self.assertIsNotNone(data['results'][0]['create_date_time'])
+
+    def _add_bill_queries(self, count):
+        products = [Product.objects.create(
+            name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.categories[0]) for i in range(count)]
+        lines = [{'seller': self.u_employee.id, 'product': product.id, 'number': 1}
+                 for product in products]
+        with CaptureQueriesContext(connection) as queries:
+            r_bill_add = self.client.post(
+                '/api/bills/bills/', data={'cash_payment': 1000, 'user': self.u_end.id, 'products': lines}, format='json')
+        self.assertEqual(r_bill_add.status_code, 201)
+        bill = Bill.objects.get(pk=r_bill_add.data['created_bill']['id'])
+        self.assertEqual(bill.sells.count(), count)
+        return len(queries)
+
+    def test_bill_code_is_stored_by_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            bill = Bill.objects.create(
+                cash_payment=1000, user=self.u_end, creator=self.u_admin)
+        bill_writes = [query['sql'] for query in queries if query['sql'].startswith(
+            ('INSERT INTO "bills_bill"', 'UPDATE "bills_bill"'))]
+        self.assertEqual(len(bill_writes), 1)
+        self.assertTrue(bill.code.startswith('vafa_{}_'.format(bill.id)))
+        self.assertEqual(Bill.objects.get(pk=bill.pk).code, bill.code)
+
+    def test_client_cant_choose_bill_code(self):
+        r_bill_add = self.client.post(
+            '/api/bills/bills/', data={'cash_payment': 1000, 'user': self.u_end.id, 'code': 'INJECTED'}, format='json')
+        self.assertEqual(r_bill_add.status_code, 201)
+        bill = Bill.objects.get(pk=r_bill_add.data['created_bill']['id'])
+        self.assertTrue(bill.code.startswith('vafa_{}_'.format(bill.id)))
+
+    def test_bill_create_query_count_is_constant(self):
+        self._add_bill_queries(1)
+        self.assertEqual(self._add_bill_queries(
+            1), self._add_bill_queries(20))
+
+
+class ProductAccessTest(APITestCase):
+    def setUp(self):
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_other_admin = User.objects.create(
+            username='u_other_admin', password='Mrb76420')
+        self.parent = Category.objects.create(name='parent', user=self.u_admin)
+        self.child = Category.objects.create(name='child', parent=self.parent)
+        self.other_category = Category.objects.create(
+            name='other', user=self.u_other_admin)
+        self.product = Product.objects.create(
+            name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.child)
+
+    def test_access_set_is_cached(self):
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id]), set())
+        with self.assertNumQueries(0):
+            self.assertEqual(inaccessible_products(
+                self.u_admin, [self.product.id]), set())
+
+    def test_access_is_cached_per_checked_product(self):
+        other = Product.objects.create(
+            name='other_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.other_category)
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id]), set())
+        with self.assertNumQueries(1):
+            self.assertEqual(inaccessible_products(
+                self.u_admin, [self.product.id, other.id]), {other.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(inaccessible_products(
+                self.u_admin, [self.product.id, other.id]), {other.id})
+
+    def test_access_set_follows_product_changes(self):
+        inaccessible_products(self.u_admin, [self.product.id])
+        new_product = Product.objects.create(
+            name='new_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.parent)
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id, new_product.id]), set())
+        self.product.category = self.other_category
+        self.product.save()
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id]), {self.product.id})
+        self.assertEqual(inaccessible_products(
+            self.u_other_admin, [self.product.id]), set())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).tenant_id, self.u_other_admin.id)
+
+    def test_access_set_follows_category_changes(self):
+        inaccessible_products(self.u_admin, [self.product.id])
+        self.child.parent = self.other_category
+        self.child.save()
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id]), {self.product.id})
+
+
+class TenantTest(APITestCase):
+    def setUp(self):
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_other_admin = User.objects.create(
+            username='u_other_admin', password='Mrb76420')
+        self.u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        self.category = Category.objects.create(
+            name='test', user=self.u_admin)
+        self.product = Product.objects.create(
+            name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.category)
+        self.bill = Bill.objects.create(
+            cash_payment=1000, user=self.u_end, creator=self.u_admin)
+        self.ticket = Ticket.objects.create(
+            subject='test', text='test', user=self.u_end)
+
+    def test_tenant_is_set_on_save(self):
+        self.assertEqual(self.bill.tenant_id, self.u_admin.id)
+        self.assertEqual(self.ticket.tenant_id, self.u_admin.id)
+        self.assertEqual(self.product.tenant_id, self.u_admin.id)
+
+    def test_tenant_follows_user_admin(self):
+        user = User.objects.get(pk=self.u_end.pk)
+        user.first_name = 'test'
+        with self.assertNumQueries(1):
+            user.save()
+        user.admin = self.u_other_admin
+        user.save()
+        self.assertEqual(Bill.objects.get(
+            pk=self.bill.pk).tenant_id, self.u_other_admin.id)
+        self.assertEqual(Ticket.objects.get(
+            pk=self.ticket.pk).tenant_id, self.u_other_admin.id)
+
+    def test_tenant_follows_category_user(self):
+        self.category.user = self.u_other_admin
+        self.category.save()
+        self.assertEqual(Product.objects.get(
+            pk=self.product.pk).tenant_id, self.u_other_admin.id)
+
+    def test_backfill_recomputes_tenants(self):
+        Bill.objects.update(tenant=None)
+        Product.objects.update(tenant=None)
+        backfill_tenants()
+        self.assertEqual(Bill.objects.get(
+            pk=self.bill.pk).tenant_id, self.u_admin.id)
+        self.assertEqual(Product.objects.get(
+            pk=self.product.pk).tenant_id, self.u_admin.id)
+
+    def test_bill_list_is_scoped_by_tenant(self):
+        refresh_token = RefreshToken().for_user(self.u_other_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+        self.u_other_admin.user_permissions.add(
+            Permission.objects.get(codename='view_bill'))
+        r_bills = self.client.get('/api/bills/bills/', format='json')
+        self.assertEqual(r_bills.data['count'], 0)
+        self.u_end.admin = self.u_other_admin
+        self.u_end.save()
+        r_bills = self.client.get('/api/bills/bills/', format='json')
+        self.assertEqual(r_bills.data['count'], 1)
+
+
+class CategoryTreeTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_category', 'change_category', 'view_product', 'change_product']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_other_admin = User.objects.create(
+            username='u_other_admin', password='Mrb76420')
+        self.chain = [Category.objects.create(
+            name='root', user=self.u_admin)]
+        for i in range(5):
+            self.chain.append(Category.objects.create(
+                name='level_'+str(i), parent=self.chain[-1]))
+        self.product = Product.objects.create(
+            name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.chain[-1])
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def test_deep_products_are_accessible(self):
+        self.assertEqual(self.chain[-1].depth, 5)
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id]), set())
+        self.assertTrue(is_owned_by(self.chain[-1], self.u_admin))
+        self.assertFalse(is_owned_by(self.chain[-1], self.u_other_admin))
+        self.assertEqual(list(ancestors(self.chain[-1])), self.chain[:-1])
+        self.assertEqual(descendants(self.chain[0]).count(), 5)
+        self.assertEqual(list(subtree_products(self.chain[2])), [self.product])
+
+    def test_deep_products_and_categories_are_served(self):
+        self.assertEqual(Product.objects.get(pk=self.product.pk).tenant_id, self.u_admin.id)
+        r_products = self.client.get('/api/bills/products/', format='json')
+        self.assertEqual([product['id'] for product in r_products.data['results']], [self.product.id])
+        r_product = self.client.patch('/api/bills/products/'+str(self.product.id)+'/', data={
+            'name': 'renamed'}, format='json')
+        self.assertEqual(r_product.status_code, 200)
+        r_category = self.client.get('/api/bills/categories/'+str(self.chain[-1].id)+'/', format='json')
+        self.assertEqual(r_category.status_code, 200)
+        self.assertEqual(self.client.get('/api/bills/categories/', format='json').data['count'], 6)
+
+    def test_moving_category_moves_subtree(self):
+        other_root = Category.objects.create(
+            name='other', user=self.u_other_admin)
+        self.chain[2].parent = other_root
+        self.chain[2].save()
+        deepest = Category.objects.get(pk=self.chain[-1].pk)
+        self.assertEqual(deepest.depth, 4)
+        self.assertEqual(list(ancestors(deepest))[0], other_root)
+        self.assertEqual(inaccessible_products(
+            self.u_admin, [self.product.id]), {self.product.id})
+        self.assertEqual(inaccessible_products(
+            self.u_other_admin, [self.product.id]), set())
+
+    def test_rebuild_paths(self):
+        Category.objects.update(path='/', depth=0)
+        rebuild_paths(Category)
+        self.assertEqual(Category.objects.get(
+            pk=self.chain[-1].pk).path, self.chain[-1].path)
+
+    def test_path_migration_fills_paths(self):
+        Category.objects.update(path='/', depth=0)
+        import_module('bills.migrations.0011_category_path').fill_paths(apps, None)
+        category = Category.objects.get(pk=self.chain[-1].pk)
+        self.assertEqual(category.path, self.chain[-1].path)
+        self.assertEqual(category.depth, self.chain[-1].depth)
+
+    def test_cant_move_category_under_itself(self):
+        r_category = self.client.patch('/api/bills/categories/'+str(self.chain[0].id)+'/', data={
+            'parent': self.chain[3].id
+        }, format='json')
+        self.assertEqual(r_category.status_code, 400)
+        other = Category.objects.create(name='other', user=self.u_admin)
+        r_category = self.client.patch('/api/bills/categories/'+str(other.id)+'/', data={
+            'parent': self.chain[-1].id
+        }, format='json')
+        self.assertEqual(r_category.status_code, 200)
+        self.assertEqual(Category.objects.get(pk=other.pk).depth, 6)
+
+    def test_tree_is_nested_with_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            r_tree = self.client.get(
+                '/api/bills/categories/tree/', format='json')
+        self.assertEqual(r_tree.status_code, 200)
+        category_queries = [query for query in queries if 'FROM "bills_category"' in query['sql']]
+        self.assertEqual(len(category_queries), 1)
+        node, depth = r_tree.data['tree'][0], 0
+        while node['children']:
+            node, depth = node['children'][0], depth+1
+        self.assertEqual(depth, 5)
+        self.assertEqual(node['id'], self.chain[-1].id)
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_product', 'view_category']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.category = Category.objects.create(
+            name='test', user=self.u_admin)
+        self.product = Product.objects.create(
+            name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.category)
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def test_product_list_is_cached_per_params(self):
+        hits = response_cache.stats(['products'])['products']['hits']
+        r_products = self.client.get('/api/bills/products/', format='json')
+        self.assertEqual(r_products['X-Cache'], 'MISS')
+        r_products = self.client.get('/api/bills/products/', format='json')
+        self.assertEqual(r_products['X-Cache'], 'HIT')
+        self.assertEqual(r_products.data['count'], 1)
+        r_products = self.client.get(
+            '/api/bills/products/?page=1', format='json')
+        self.assertEqual(r_products['X-Cache'], 'MISS')
+        self.assertEqual(response_cache.stats(
+            ['products'])['products']['hits'], hits+1)
+
+    def test_changes_invalidate_cached_lists(self):
+        self.client.get('/api/bills/products/', format='json')
+        self.client.get('/api/bills/categories/', format='json')
+        Product.objects.create(
+            name='new_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.category)
+        r_products = self.client.get('/api/bills/products/', format='json')
+        self.assertEqual(r_products['X-Cache'], 'MISS')
+        self.assertEqual(r_products.data['count'], 2)
+        self.assertEqual(self.client.get(
+            '/api/bills/categories/', format='json')['X-Cache'], 'HIT')
+        self.category.name = 'renamed'
+        self.category.save()
+        r_categories = self.client.get(
+            '/api/bills/categories/', format='json')
+        self.assertEqual(r_categories['X-Cache'], 'MISS')
+        self.assertEqual(r_categories.data['results'][0]['name'], 'renamed')
+        self.assertEqual(self.client.get(
+            '/api/bills/products/', format='json')['X-Cache'], 'MISS')
+
+    def test_permissions_are_checked_before_cache(self):
+        self.client.get('/api/bills/products/', format='json')
+        self.u_admin.groups.clear()
+        r_products = self.client.get('/api/bills/products/', format='json')
+        self.assertEqual(r_products.status_code, 403)
+
+
+class ConditionalListTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_bill', 'view_product']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        self.category = Category.objects.create(
+            name='test', user=self.u_admin)
+        self.product = Product.objects.create(
+            name='test_product', inventory=2, price=1000, last_price=1200, discount=0, category=self.category)
+        self.bill = Bill.objects.create(
+            cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+        BillProduct.objects.create(
+            bill=self.bill, product=self.product, seller=self.u_admin)
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def test_unchanged_bill_list_is_not_modified(self):
+        r_bills = self.client.get('/api/bills/bills/', format='json')
+        self.assertEqual(r_bills.status_code, 200)
+        self.assertTrue(r_bills.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as queries:
+            r_bills = self.client.get(
+                '/api/bills/bills/', HTTP_IF_NONE_MATCH=r_bills['ETag'])
+        self.assertEqual(r_bills.status_code, 304)
+        self.assertEqual(r_bills.content, b'')
+        self.assertFalse(any('bills_billproduct' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_delete_is_not_hidden_by_if_modified_since(self):
+        Bill.objects.create(
+            cash_payment=500, code='test', user=self.u_end, creator=self.u_admin)
+        last_modified = self.client.get('/api/bills/bills/', format='json')['Last-Modified']
+        Bill.objects.filter(pk=self.bill.pk).delete()
+        r_bills = self.client.get(
+            '/api/bills/bills/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(r_bills.status_code, 200)
+        self.assertEqual(r_bills.data['count'], 1)
+
+    def test_recalculated_totals_refresh_the_etag(self):
+        etag = self.client.get('/api/bills/bills/', format='json')['ETag']
+        modified = Bill.objects.get(pk=self.bill.pk).date_modified
+        BillProduct.objects.filter(bill=self.bill).update(line_total=700)
+        recalculate([self.bill.pk])
+        bill = Bill.objects.get(pk=self.bill.pk)
+        self.assertEqual(bill.total, 700)
+        self.assertGreater(bill.date_modified, modified)
+        r_bills = self.client.get('/api/bills/bills/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r_bills.status_code, 200)
+        self.assertEqual(r_bills.data['results'][0]['total'], 700)
+
+    def test_changes_refresh_the_etag(self):
+        etag = self.client.get('/api/bills/bills/', format='json')['ETag']
+        self.assertNotEqual(self.client.get(
+            '/api/bills/bills/?page=1', format='json')['ETag'], etag)
+        self.bill.cash_payment = 2000
+        self.bill.save()
+        r_bills = self.client.get('/api/bills/bills/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r_bills.status_code, 200)
+        etag = r_bills['ETag']
+        self.product.name = 'renamed'
+        self.product.save()
+        r_bills = self.client.get('/api/bills/bills/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r_bills.status_code, 200)
+        self.assertEqual(r_bills.data['results'][0]['products'][0]['name'], 'renamed')
+        Bill.objects.filter(pk=self.bill.pk).delete()
+        r_bills = self.client.get(
+            '/api/bills/bills/', HTTP_IF_NONE_MATCH=r_bills['ETag'])
+        self.assertEqual(r_bills.status_code, 200)
+        self.assertEqual(r_bills.data['count'], 0)
+
+    def test_product_list_is_not_modified_before_cache(self):
+        etag = self.client.get('/api/bills/products/', format='json')['ETag']
+        r_products = self.client.get(
+            '/api/bills/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r_products.status_code, 304)
+        self.assertFalse(r_products.has_header('X-Cache'))
+
+    def test_category_rename_refreshes_product_etag(self):
+        etag = self.client.get('/api/bills/products/', format='json')['ETag']
+        self.category.name = 'renamed'
+        self.category.save()
+        r_products = self.client.get(
+            '/api/bills/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r_products.status_code, 200)
+        self.assertEqual(r_products.data['results'][0]['category']['name'], 'renamed')
+
+
+class CursorPaginationTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_bill']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        bills = [Bill.objects.create(
+            cash_payment=1000, code='test', user=u_end, creator=self.u_admin) for i in range(5)]
+        # bills created in the same instant are told apart by id
+        Bill.objects.filter(pk__in=[bills[1].pk, bills[2].pk]).update(
+            date_created=bills[1].date_created)
+        self.bill_ids = list(Bill.objects.order_by(
+            'date_created', 'id').values_list('id', flat=True))
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def test_pages_follow_date_created_and_id(self):
+        url = '/api/bills/bills/?pagination=cursor&page_size=2'
+        seen = []
+        while url:
+            r_bills = self.client.get(url, format='json')
+            self.assertEqual(r_bills.status_code, 200)
+            self.assertNotIn('count', r_bills.data)
+            seen += [bill['id'] for bill in r_bills.data['results']]
+            previous, url = r_bills.data['previous'], r_bills.data['next']
+        self.assertEqual(seen, self.bill_ids)
+        r_bills = self.client.get(previous, format='json')
+        self.assertEqual([bill['id'] for bill in r_bills.data['results']],
+                         self.bill_ids[2:4])
+
+    def test_counts_are_optional(self):
+        r_bills = self.client.get(
+            '/api/bills/bills/?pagination=cursor&count=exact', format='json')
+        self.assertEqual(r_bills.data['count'], 5)
+        r_bills = self.client.get(
+            '/api/bills/bills/?pagination=cursor&count=approximate', format='json')
+        self.assertIsInstance(r_bills.data['count'], int)
+        r_bills = self.client.get('/api/bills/bills/', format='json')
+        self.assertEqual(r_bills.data['count'], 5)
+
+    def test_invalid_cursor(self):
+        r_bills = self.client.get(
+            '/api/bills/bills/?pagination=cursor&cursor=bad', format='json')
+        self.assertEqual(r_bills.status_code, 404)
+
+
+class BillExportTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_bill']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_seller = User.objects.create(
+            username='u_seller', password='Mrb76420', first_name='seller', admin=self.u_admin)
+        u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        category = Category.objects.create(name='test', user=self.u_admin)
+        products = [Product.objects.create(
+            name='product_'+str(i), inventory=2, price=1000, last_price=1200, discount=0, category=category) for i in range(2)]
+        self.bill = Bill.objects.create(
+            cash_payment=1000, code='test', user=u_end, creator=self.u_admin)
+        for product in products:
+            BillProduct.objects.create(
+                bill=self.bill, product=product, seller=self.u_seller, number=2)
+        self.old_bill = Bill.objects.create(
+            cash_payment=500, code='old', user=u_end, creator=self.u_admin)
+        Bill.objects.filter(pk=self.old_bill.pk).update(
+            date_created=timezone.now()-datetime.timedelta(days=40))
+        u_other = User.objects.create(username='u_other', password='Mrb76420')
+        Bill.objects.create(cash_payment=1, code='other',
+                            user=u_other, creator=u_other)
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def _export(self, query=''):
+        r_export = self.client.get('/api/bills/bills/export/' + query)
+        self.assertEqual(r_export.status_code, 200)
+        self.assertTrue(r_export.streaming)
+        return r_export, b''.join(r_export.streaming_content).decode()
+
+    def test_csv_has_a_row_per_line_item(self):
+        r_export, content = self._export()
+        self.assertTrue(r_export['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['code'] for row in rows], ['old', self.bill.code, self.bill.code])
+        self.assertEqual(rows[0]['product'], '')
+        self.assertEqual([row['product'] for row in rows[1:]], ['product_0', 'product_1'])
+        self.assertEqual(rows[1]['seller_first_name'], 'seller')
+        self.assertEqual(rows[1]['number'], '2')
+
+    def test_export_uses_line_price_snapshot(self):
+        Product.objects.filter(sells__isnull=False).update(price=5000)
+        r_export, content = self._export()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([(row['price'], row['line_total']) for row in rows[1:]], [
+                         ('1000', '2000'), ('1000', '2000')])
+
+    def test_jsonl_is_filtered_by_date(self):
+        since = (timezone.now()-datetime.timedelta(days=1)).isoformat()
+        r_export, content = self._export(
+            '?file_type=jsonl&date_created__gte=' + since.replace('+', '%2B'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['bill_id'] for row in rows}, {self.bill.id})
+        self.assertEqual(rows[0]['seller'], 'u_seller')
+
+    def test_invalid_export_options(self):
+        self.assertEqual(self.client.get(
+            '/api/bills/bills/export/?file_type=xlsx').status_code, 400)
+        self.assertEqual(self.client.get(
+            '/api/bills/bills/export/?date_created__gte=soon').status_code, 400)
+
+
+class BillImportTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_bill', 'add_bill']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_seller = User.objects.create(
+            username='u_seller', password='Mrb76420', admin=self.u_admin)
+        self.u_seller.groups.add(Group.objects.create(name='employee_user'))
+        self.u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        category = Category.objects.create(name='test', user=self.u_admin)
+        self.product = Product.objects.create(
+            name='test_product', inventory=1000, price=1000, last_price=1200, discount=0, category=category)
+        u_other = User.objects.create(username='u_other', password='Mrb76420')
+        self.other_product = Product.objects.create(
+            name='other_product', inventory=2, price=1000, last_price=1200, discount=0,
+            category=Category.objects.create(name='other', user=u_other))
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def _csv(self, bills):
+        lines = ['bill,user,cash_payment,debt,product,seller,number']
+        for i in range(bills):
+            lines.append('{0},{1},1000,200,{2},{3},2'.format(
+                i, self.u_end.id, self.product.id, self.u_seller.id))
+            lines.append('{0},{1},1000,200,{2},{3},1'.format(
+                i, self.u_end.id, self.product.id, self.u_seller.id))
+        return '\n'.join(lines) + '\n'
+
+    def test_import_validates_rows_and_inserts_in_batches(self):
+        content = self._csv(2) + '\n'.join([
+            'empty,{0},500,0,,,'.format(self.u_end.id),
+            'foreign,{0},500,0,{1},{2},1'.format(
+                self.u_end.id, self.other_product.id, self.u_seller.id),
+            'stranger,{0},500,0,,,'.format(self.u_seller.id + 1000),
+            ',{0},500,0,,,'.format(self.u_end.id),
+        ])
+        progress = []
+        result = import_bills(io.StringIO(content), 'csv', self.u_admin,
+                              batch_size=2, progress=lambda result: progress.append(result.bills))
+        self.assertEqual(result.bills, 3)
+        self.assertEqual(result.line_items, 4)
+        self.assertEqual(result.error_count, 3)
+        self.assertEqual(sorted(str(error['bill']) for error in result.errors), [
+                         'None', 'foreign', 'stranger'])
+        self.assertEqual(progress, [2, 3, 3])
+        bills = Bill.objects.filter(tenant=self.u_admin)
+        self.assertEqual(bills.count(), 3)
+        for bill in bills:
+            self.assertTrue(bill.code.startswith('vafa_{}_'.format(bill.id)))
+            self.assertEqual(bill.creator_id, self.u_admin.id)
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.bills_created, 3)
+        self.assertEqual(statistic.bill_revenue, 2900)
+
+    def test_import_rejects_interleaved_bill_rows(self):
+        content = '\n'.join([
+            'bill,user,cash_payment,debt,product,seller,number',
+            'a,{0},1000,0,{1},{2},1'.format(self.u_end.id, self.product.id, self.u_seller.id),
+            'b,{0},1000,0,{1},{2},1'.format(self.u_end.id, self.product.id, self.u_seller.id),
+            'a,{0},1000,0,{1},{2},2'.format(self.u_end.id, self.product.id, self.u_seller.id),
+        ]) + '\n'
+        result = import_bills(io.StringIO(content), 'csv', self.u_admin)
+        self.assertEqual(result.bills, 2)
+        self.assertEqual(result.errors, [{'line': 4, 'bill': 'a', 'errors': [
+            'rows of bill a are not next to each other']}])
+        self.assertEqual(BillProduct.objects.filter(bill__tenant=self.u_admin).count(), 2)
+
+    def test_import_only_rebuilds_touched_days(self):
+        joined = timezone.now() - datetime.timedelta(days=30)
+        User.objects.filter(pk=self.u_end.pk).update(date_joined=joined)
+        # an older day the import does not touch keeps its row as it is
+        older = DailyStatistic.objects.create(
+            admin=self.u_admin, day=timezone.localdate(joined) - datetime.timedelta(days=1), bills_created=7)
+        import_bills(io.StringIO(self._csv(1)), 'csv', self.u_admin)
+        older.refresh_from_db()
+        self.assertEqual(older.bills_created, 7)
+        self.assertEqual(DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate(joined)).users_with_bills, 1)
+        self.assertEqual(DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate()).bills_created, 1)
+
+    def test_import_takes_lines_out_of_inventory(self):
+        self.product.inventory = 5
+        self.product.save()
+        result = import_bills(io.StringIO(self._csv(3)), 'csv', self.u_admin)
+        self.assertEqual(result.bills, 1)
+        self.assertEqual([error['bill'] for error in result.errors], ['1', '2'])
+        self.assertEqual(result.errors[0]['errors'], [
+                         'product {} has 2 left, 3 requested'.format(self.product.id)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 2)
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        # the first import fills the product access cache
+        import_bills(io.StringIO(self._csv(1)), 'csv', self.u_admin)
+        with CaptureQueriesContext(connection) as few:
+            import_bills(io.StringIO(self._csv(2)), 'csv', self.u_admin)
+        with CaptureQueriesContext(connection) as many:
+            import_bills(io.StringIO(self._csv(40)), 'csv', self.u_admin)
+        self.assertEqual(Bill.objects.count(), 43)
+        self.assertEqual(len(many), len(few))
+
+    def test_import_endpoint_runs_task(self):
+        content = '\n'.join(json.dumps({'bill': i, 'user': self.u_end.id, 'cash_payment': 100,
+                                         'product': self.product.id, 'seller': self.u_seller.id})
+                              for i in range(3))
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with mock.patch.object(import_bills_file, 'delay') as delay:
+                delay.return_value.id = 'task'
+                r_import = self.client.post('/api/bills/bills/import/', {
+                    'file': SimpleUploadedFile('bills.jsonl', content.encode())}, format='multipart')
+            self.assertEqual(r_import.status_code, 202)
+            self.assertEqual(r_import.data['task_id'], 'task')
+            path, file_type, user_id = delay.call_args[0]
+            self.assertEqual(file_type, 'jsonl')
+            result = import_bills_file.apply(args=[path, file_type, user_id]).get()
+        self.assertEqual(result['bills'], 3)
+        self.assertEqual(result['user'], self.u_admin.id)
+        self.assertEqual(BillProduct.objects.filter(bill__tenant=self.u_admin).count(), 3)
+        r_status = self.client.get('/api/bills/bills/import/unknown/')
+        self.assertEqual(r_status.data['state'], 'PENDING')
+
+    def test_import_endpoint_rejects_unknown_files(self):
+        r_import = self.client.post('/api/bills/bills/import/', {
+            'file': SimpleUploadedFile('bills.xlsx', b'')}, format='multipart')
+        self.assertEqual(r_import.status_code, 400)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write(self._csv(3))
+            file.flush()
+            out = io.StringIO()
+            call_command('import_bills', file.name, user=self.u_admin.id, stdout=out)
+        self.assertIn('imported 3 bills with 6 line items', out.getvalue())
+
+
+class InventoryTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'add_bill', 'view_product']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_employee = User.objects.create(
+            username='u_employee', password='Mrb76420', admin=self.u_admin)
+        self.u_employee.groups.add(Group.objects.create(name='employee_user'))
+        self.u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        category = Category.objects.create(name='test', user=self.u_admin)
+        self.products = [Product.objects.create(
+            name='test_product', inventory=3, price=1000, last_price=1200, discount=0, category=category) for i in range(2)]
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def _add_bill(self, numbers):
+        return self.client.post('/api/bills/bills/', data={'cash_payment': 1000, 'user': self.u_end.id, 'products': [
+            {'seller': self.u_employee.id, 'product': product.id, 'number': number} for product, number in numbers]}, format='json')
+
+    def _inventory(self):
+        return [product.inventory for product in Product.objects.filter(pk__in=[product.pk for product in self.products]).order_by('pk')]
+
+    def test_bill_takes_products_out_of_inventory(self):
+        r_bill = self._add_bill([(self.products[0], 2), (self.products[1], 1), (self.products[0], 1)])
+        self.assertEqual(r_bill.status_code, 201)
+        self.assertEqual(self._inventory(), [0, 2])
+        r_products = self.client.get('/api/bills/products/', format='json')
+        self.assertEqual(sorted(product['inventory'] for product in r_products.data['results']), [0, 2])
+
+    def test_shortfall_rejects_whole_bill(self):
+        r_bill = self._add_bill([(self.products[0], 1), (self.products[1], 4)])
+        self.assertEqual(r_bill.status_code, 400)
+        self.assertEqual(r_bill.data['shortfalls'], {
+            self.products[1].id: {'requested': 4, 'available': 3}})
+        self.assertEqual(self._inventory(), [3, 3])
+        self.assertFalse(Bill.objects.exists())
+
+    def test_reserve_reports_missing_products(self):
+        with self.assertRaises(InsufficientInventory) as context:
+            reserve([(self.products[0].id, 1), (0, 1)])
+        self.assertEqual(context.exception.shortfalls, {
+                         0: {'requested': 1, 'available': 0}})
+        self.assertEqual(self._inventory(), [3, 3])
+
+
+class InventoryConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        category = Category.objects.create(name='test', user=self.u_admin)
+        self.product = Product.objects.create(
+            name='hot_product', inventory=5, price=1000, last_price=1200, discount=0, category=category)
+
+    def _in_thread(self, target, count):
+        outcomes = []
+
+        def run():
+            try:
+                outcomes.append(target())
+            except Exception as error:
+                outcomes.append(error)
+            finally:
+                connection.close()
+        threads = [threading.Thread(target=run) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_reservations_never_oversell(self):
+        outcomes = self._in_thread(lambda: reserve([(self.product.id, 2)]), 4)
+        self.assertEqual(outcomes.count(None), 2)
+        self.assertEqual(
+            sum(isinstance(outcome, InsufficientInventory) for outcome in outcomes), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 1)
+
+    @override_settings(INVENTORY_LOCK_TIMEOUT=50)
+    def test_locked_product_times_out(self):
+        with transaction.atomic():
+            Product.objects.select_for_update().get(pk=self.product.pk)
+            outcomes = self._in_thread(lambda: reserve([(self.product.id, 1)]), 1)
+        self.assertIsInstance(outcomes[0], InventoryBusy)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 5)
+
+
+class BillTotalsTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'add_bill', 'change_bill', 'view_bill', 'view_product']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_employee = User.objects.create(
+            username='u_employee', password='Mrb76420', admin=self.u_admin)
+        self.u_employee.groups.add(Group.objects.create(name='employee_user'))
+        self.u_end = User.objects.create(
+            username='u_end', password='Mrb76420', admin=self.u_admin)
+        category = Category.objects.create(name='test', user=self.u_admin)
+        self.product = Product.objects.create(
+            name='test_product', inventory=10, price=1000, last_price=1200, discount=10, category=category)
+        self.other_product = Product.objects.create(
+            name='other_product', inventory=10, price=250, last_price=300, discount=0, category=category)
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def _add_bill(self):
+        return self.client.post('/api/bills/bills/', data={'cash_payment': 1500, 'debt': 300, 'user': self.u_end.id, 'products': [
+            {'seller': self.u_employee.id, 'product': self.product.id, 'number': 2},
+            {'seller': self.u_employee.id, 'product': self.other_product.id, 'number': 3}]}, format='json')
+
+    def test_bill_stores_line_prices_and_totals(self):
+        r_bill = self._add_bill()
+        self.assertEqual(r_bill.status_code, 201)
+        bill = Bill.objects.get(user=self.u_end)
+        self.assertEqual((bill.total, bill.discount_total, bill.balance), (2550, 200, 750))
+        self.assertEqual(sorted(BillProduct.objects.filter(bill=bill).values_list('unit_price', 'discount', 'line_total')), [
+                         (250, 0, 750), (1000, 10, 1800)])
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.sales_total, 2550)
+        self.assertEqual(statistic.bill_revenue, 1800)
+
+    def test_price_changes_keep_bill_totals(self):
+        self._add_bill()
+        self.product.price = 5000
+        self.product.discount = 0
+        self.product.save()
+        bill = Bill.objects.get(user=self.u_end)
+        self.assertEqual(bill.total, 2550)
+        BillProduct.objects.create(bill=bill, product=self.product, seller=self.u_employee, number=1)
+        bill.refresh_from_db()
+        self.assertEqual((bill.total, bill.discount_total, bill.balance), (7550, 200, 5750))
+        self.assertEqual(DailyStatistic.objects.get(admin=self.u_admin).sales_total, 7550)
+
+    def test_payments_update_balance(self):
+        self._add_bill()
+        bill = Bill.objects.get(user=self.u_end)
+        bill.cash_payment = 2250
+        bill.save(update_fields=['cash_payment'])
+        bill.refresh_from_db()
+        self.assertEqual(bill.balance, 0)
+
+    def test_import_stores_totals(self):
+        content = '\n'.join(['bill,user,cash_payment,debt,product,seller,number',
+                             '1,{0},1000,0,{1},{2},2'.format(
+                                 self.u_end.id, self.product.id, self.u_employee.id),
+                             '1,{0},1000,0,{1},{2},1'.format(self.u_end.id, self.other_product.id, self.u_employee.id)]) + '\n'
+        import_bills(io.StringIO(content), 'csv', self.u_admin)
+        bill = Bill.objects.get(user=self.u_end)
+        self.assertEqual((bill.total, bill.discount_total, bill.balance), (2050, 200, 1050))
+        self.assertEqual(sorted(BillProduct.objects.filter(bill=bill).values_list('line_total', flat=True)), [250, 1800])
+        self.assertEqual(DailyStatistic.objects.get(admin=self.u_admin).sales_total, 2050)
+
+    def test_client_cant_set_totals(self):
+        r_bill = self.client.post('/api/bills/bills/', data={
+            'cash_payment': 1000, 'user': self.u_end.id, 'total': 999999, 'discount_total': 5}, format='json')
+        self.assertEqual(r_bill.status_code, 201)
+        bill = Bill.objects.get(user=self.u_end)
+        self.assertEqual((bill.total, bill.discount_total, bill.balance), (0, 0, -1000))
+
+    def test_deletes_refresh_totals(self):
+        self._add_bill()
+        bill = Bill.objects.get(user=self.u_end)
+        BillProduct.objects.filter(bill=bill, product=self.other_product).delete()
+        bill.refresh_from_db()
+        self.assertEqual((bill.total, bill.discount_total, bill.balance), (1800, 200, 0))
+        self.assertEqual(DailyStatistic.objects.get(admin=self.u_admin).sales_total, 1800)
+        self.product.delete()
+        bill.refresh_from_db()
+        self.assertEqual((bill.total, bill.balance), (0, -1800))
+        self.assertEqual(DailyStatistic.objects.get(admin=self.u_admin).sales_total, 0)
+
+    def test_deleting_bill_lowers_sales_total(self):
+        self._add_bill()
+        self._add_bill()
+        Bill.objects.filter(user=self.u_end).first().delete()
+        self.assertEqual(DailyStatistic.objects.get(admin=self.u_admin).sales_total, 2550)
+        self.u_admin.delete()
+        self.assertFalse(Bill.objects.exists())
+        self.assertFalse(DailyStatistic.objects.exists())
+
+    def test_backfill_totals(self):
+        self._add_bill()
+        BillProduct.objects.update(unit_price=0, discount=0, line_total=0)
+        Bill.objects.update(total=0, discount_total=0, balance=0)
+        import_module('bills.migrations.0012_bill_totals').fill_totals(apps, None)
+        bill = Bill.objects.get(user=self.u_end)
+        self.assertEqual((bill.total, bill.discount_total, bill.balance), (2550, 200, 750))
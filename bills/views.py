@@ -4,26 +4,47 @@ from .serializers import *
 from rest_framework.permissions import IsAuthenticated
 from .permissions import *
 from rest_framework.authentication import TokenAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from users.authentication import StatelessJWTAuthentication
 from .models import Bill
 from rest_framework.response import Response
-from django.db.models import Q
-
-
-class BillViewSet(viewsets.ModelViewSet):
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+from rest_framework.decorators import action
+from .categories import build_tree, owned_categories
+from crm.response_cache import CachedListMixin
+from crm.conditional import ConditionalListMixin
+from crm.pagination import SelectablePaginationMixin
+from .export import CONTENT_TYPES, export_response
+from .filters import BillExportFilter
+from .inventory import InsufficientInventory, InventoryBusy
+from .imports import FILE_TYPES
+from .tasks import import_bills_file
+from celery.result import AsyncResult
+from django.core.files.storage import default_storage
+from rest_framework.parsers import MultiPartParser
+import uuid
+from django.db.models import F, Q, Prefetch, prefetch_related_objects
+
+
+def bill_products_prefetch():
+    return Prefetch('products', queryset=Product.objects.select_related('category'))
+
+
+class BillViewSet(ConditionalListMixin, SelectablePaginationMixin, viewsets.ModelViewSet):
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+    # bills embed their products, which change without touching the bill, and totals are
+    # recalculated with queryset updates
+    etag_scopes = ('products', 'bills')
     serializer_class = BillSerializer
 
     def get_queryset(self):
-        return Bill.objects.filter(user__admin=self.request.user)
+        return Bill.objects.filter(tenant=self.request.user).prefetch_related(bill_products_prefetch())
 
     def get_permissions(self):
-        if self.action == 'list':
+        if self.action in ['list', 'export']:
             permission_classes = [IsAuthenticated, BillViewPermission]
         elif self.action == 'retrieve':
             permission_classes = [IsAuthenticated, BillRetrievePermission]
 
-        elif self.action == 'create':
+        elif self.action in ['create', 'bulk_import', 'import_status']:
             permission_classes = [IsAuthenticated, BillAddPermission]
         elif self.action in ['update', 'partial_update']:
             permission_classes = [IsAuthenticated, BillChangePermission]
@@ -35,7 +56,7 @@ class BillViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def retrieve(self, request, pk=0):
-        bill = Bill.objects.get(pk=pk)
+        bill = Bill.objects.select_related('user').get(pk=pk)
         self.check_object_permissions(request, bill)
         return super().retrieve(request, pk=pk)
 
@@ -43,7 +64,15 @@ class BillViewSet(viewsets.ModelViewSet):
         bill_form_serializer = BillFormSerializer(
             data=request.data, context={'request': request})
         if bill_form_serializer.is_valid():
-            bill = bill_form_serializer.create(request.data, request.user)
+            try:
+                # only validated fields reach the bill, code and totals are never taken from the client
+                bill = bill_form_serializer.create(
+                    {**bill_form_serializer.validated_data, 'products': request.data.get('products')}, request.user)
+            except InsufficientInventory as error:
+                return Response({'response': {'products': error.messages()}, 'shortfalls': error.shortfalls}, status=400)
+            except InventoryBusy as error:
+                return Response({'response': {'products': [str(error)]}}, status=409)
+            prefetch_related_objects([bill], bill_products_prefetch())
             return Response({'created_bill': BillSerializer(bill).data}, status=201)
         else:
             return Response({'response': bill_form_serializer.errors}, status=400)
@@ -58,16 +87,51 @@ class BillViewSet(viewsets.ModelViewSet):
         self.check_object_permissions(request, bill)
         return super().destroy(request, pk=pk)
 
-
-class CategoryViewSet(viewsets.ModelViewSet):
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    @action(detail=False)
+    def export(self, request):
+        file_type = request.query_params.get('file_type', 'csv')
+        if file_type not in CONTENT_TYPES:
+            return Response({'errors': {'file_type': ['choose one of ' + ', '.join(CONTENT_TYPES)]}}, status=400)
+        bill_filter = BillExportFilter(
+            request.query_params, queryset=Bill.objects.filter(tenant=request.user))
+        if not bill_filter.is_valid():
+            return Response({'errors': bill_filter.errors}, status=400)
+        return export_response(bill_filter.qs, file_type)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        file = request.data.get('file')
+        if file is None:
+            return Response({'errors': {'file': ['file is required']}}, status=400)
+        file_type = request.data.get('file_type') or file.name.rsplit('.', 1)[-1].lower()
+        if file_type not in FILE_TYPES:
+            return Response({'errors': {'file_type': ['choose one of ' + ', '.join(FILE_TYPES)]}}, status=400)
+        path = default_storage.save(
+            'imports/bills-{}.{}'.format(uuid.uuid4().hex, file_type), file)
+        task = import_bills_file.delay(path, file_type, request.user.id)
+        return Response({'task_id': task.id}, status=202)
+
+    @action(detail=False, url_path=r'import/(?P<task_id>[\w-]+)')
+    def import_status(self, request, task_id=None):
+        result = AsyncResult(task_id)
+        info = result.info if isinstance(result.info, dict) else {}
+        if result.state != 'PENDING' and info.get('user') != request.user.id:
+            return Response(status=404)
+        return Response({'state': result.state, 'progress': info})
+
+
+class CategoryViewSet(CachedListMixin, viewsets.ModelViewSet):
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+    cache_scope = 'categories'
     serializer_class = CategorySerializer
 
     def get_queryset(self):
-        return Category.objects.filter(Q(user=self.request.user)|Q(user=self.request.user.admin))
+        owners = [owner for owner in [self.request.user.id,
+                                      self.request.user.admin_id] if owner]
+        return owned_categories(Category.objects.all(), owners)
 
     def get_permissions(self):
-        if self.action == 'list':
+        if self.action in ['list', 'tree']:
             permission_classes = [IsAuthenticated, CategoryViewPermission]
         elif self.action == 'retrieve':
             permission_classes = [IsAuthenticated, CategoryRetrievePermission]
@@ -91,18 +155,29 @@ class CategoryViewSet(viewsets.ModelViewSet):
         else:
             return Response({'errors': category_serializer.errors}, status=400)
 
+    @action(detail=False)
+    def tree(self, request):
+        owners = [owner for owner in [request.user.id,
+                                      request.user.admin_id] if owner]
+        categories = owned_categories(
+            Category.objects.all(), owners).order_by('depth', 'date_created')
+        return Response({'tree': build_tree(CategorySerializer(categories, many=True).data)})
+
     def destroy(self, request, pk=0):
         category = Category.objects.get(pk=pk)
         self.check_object_permissions(request, category)
         return super().destroy(request, pk=pk)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+class ProductViewSet(ConditionalListMixin, CachedListMixin, viewsets.ModelViewSet):
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+    cache_scope = 'products'
+    # the serialized product nests its category, whose changes bump this scope
+    etag_scopes = ('products',)
     serializer_class = ProductSerializer
 
     def get_queryset(self):
-        return Product.objects.filter(Q(user=self.request.user) | Q(category__user=self.request.user))
+        return Product.objects.filter(Q(user=self.request.user) | Q(tenant=self.request.user)).select_related('category').annotate(user_admin_id=F('user__admin'))
 
     def get_permissions(self):
         if self.action == 'list':
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .dates import date_times
+
+
+class DateTimeDisplayAdmin(admin.ModelAdmin):
+    date_time_fields = ('date_created', 'date_modified')
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        # format the dates of the whole page at once before rows are rendered
+        date_times(getattr(item, field, None)
+                   for item in changelist.result_list for field in self.date_time_fields)
+        return changelist
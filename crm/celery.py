@@ -29,5 +29,15 @@ app.conf.beat_schedule = {
         'task': 'send_turn_message',
         'schedule': crontab(minute=0),
         'args': (),
-    }
+    },
+    'reconcile-daily-statistics-every-night': {
+        'task': 'reconcile_daily_statistics',
+        'schedule': crontab(minute=30, hour=0),
+        'args': (),
+    },
+    'rotate-request-logs-every-day': {
+        'task': 'rotate_request_logs',
+        'schedule': crontab(minute=0, hour=1),
+        'args': (),
+    },
 }
@@ -0,0 +1,41 @@
+import hashlib
+from calendar import timegm
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from . import response_cache
+
+
+def list_validators(queryset):
+    return queryset.order_by().aggregate(last_modified=Max('date_modified'), count=Count('pk'))
+
+
+class ConditionalListMixin:
+    etag_scopes = ()
+
+    def get_etag_versions(self):
+        owners = [self.request.user.id, self.request.user.admin_id]
+        return [response_cache.versions(scope, owners) for scope in self.etag_scopes]
+
+    def get_list_validators(self, request):
+        validators = list_validators(self.filter_queryset(self.get_queryset()))
+        last_modified = validators['last_modified']
+        params = sorted(request.query_params.lists())
+        raw = repr((request.user.pk, request.path, params, validators['count'],
+                    last_modified.isoformat() if last_modified else None, self.get_etag_versions()))
+        etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+        return etag, timegm(last_modified.utctimetuple()) if last_modified else None
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        # deletes do not move the newest date_modified, so only the etag decides a 304
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # clients and proxies have to come back with the validators on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,24 @@
+from functools import lru_cache
+import jdatetime
+
+DATE_FORMAT = '%Y/%m/%d'
+TIME_FORMAT = '%H:%M'
+
+
+@lru_cache(maxsize=8192)
+def jalali_day(day):
+    return jdatetime.date.fromgregorian(date=day).strftime(DATE_FORMAT)
+
+
+def date_time(value):
+    if value is None:
+        return None
+    time = value.strftime(TIME_FORMAT)
+    return value.strftime(DATE_FORMAT) + ' ' + time, jalali_day(value.date()) + ' ' + time
+
+
+def date_times(values):
+    values = list(values)
+    for day in {value.date() for value in values if value is not None}:
+        jalali_day(day)
+    return [date_time(value) for value in values]
@@ -0,0 +1,45 @@
+from django.db import models
+from rest_framework import serializers
+from .dates import date_time, date_times
+
+
+class DateTimeDisplayField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        rendered = getattr(self.parent, 'rendered_dates', None)
+        if rendered is not None and value in rendered:
+            return rendered[value]
+        return date_time(value)
+
+
+def date_sources(serializer, path=()):
+    # nested single serializers render inside the row, so their dates join the page batch
+    for field in serializer.fields.values():
+        if isinstance(field, DateTimeDisplayField):
+            yield serializer, path + (field.source,)
+        elif isinstance(field, serializers.Serializer):
+            yield from date_sources(field, path + (field.source,))
+
+
+def source_value(item, path):
+    for name in path:
+        if item is None:
+            return None
+        item = getattr(item, name)
+    return item
+
+
+class DateTimeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        sources = list(date_sources(self.child))
+        values = [source_value(item, path) for item in items for serializer, path in sources]
+        # convert the whole page at once, the rows read their dates back from it
+        rendered = dict(zip(values, date_times(values)))
+        owners = {serializer for serializer, path in sources}
+        for serializer in owners:
+            serializer.rendered_dates = rendered
+        try:
+            return super().to_representation(items)
+        finally:
+            for serializer in owners:
+                del serializer.rendered_dates
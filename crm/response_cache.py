@@ -0,0 +1,80 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+def version_key(scope, owner_id=None):
+    return 'responses:version:{}:{}'.format(scope, '*' if owner_id is None else owner_id)
+
+
+def counter_key(scope, name):
+    return 'responses:{}:{}'.format(name, scope)
+
+
+def incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the key is missing or evicted, start counting again
+        cache.add(key, 0, None)
+        return cache.incr(key)
+
+
+def bump(scope, owners=None):
+    if owners is None:
+        incr(version_key(scope))
+        return
+    for owner_id in set(owners) - {None}:
+        incr(version_key(scope, owner_id))
+
+
+def refresh(scope, owners=None):
+    # bump again after commit so a response cached from uncommitted data does not survive
+    bump(scope, owners)
+    transaction.on_commit(lambda: bump(scope, owners))
+
+
+def versions(scope, owners):
+    keys = [version_key(scope)] + [version_key(scope, owner_id) for owner_id in owners]
+    stored = cache.get_many(keys)
+    return [stored.get(key, 0) for key in keys]
+
+
+def response_key(request, scope, owners, extra=()):
+    params = sorted(request.query_params.lists())
+    raw = repr((request.get_host(), request.path, params, versions(scope, owners), tuple(extra)))
+    return 'responses:{}:{}:{}'.format(scope, request.user.pk, hashlib.sha1(raw.encode()).hexdigest())
+
+
+def cached_response(request, scope, owners, build, extra=()):
+    key = response_key(request, scope, owners, extra)
+    data = cache.get(key)
+    if data is not None:
+        incr(counter_key(scope, 'hits'))
+        return Response(data, headers={'X-Cache': 'HIT'})
+    incr(counter_key(scope, 'misses'))
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def stats(scopes):
+    counters = cache.get_many([counter_key(scope, name)
+                              for scope in scopes for name in ['hits', 'misses']])
+    return {scope: {name: counters.get(counter_key(scope, name), 0) for name in ['hits', 'misses']}
+            for scope in scopes}
+
+
+class CachedListMixin:
+    cache_scope = None
+
+    def get_cache_owners(self):
+        return [self.request.user.id, self.request.user.admin_id]
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, self.cache_scope, self.get_cache_owners(),
+                               lambda: super(CachedListMixin, self).list(request, *args, **kwargs))
@@ -104,6 +104,8 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'users.User'
 
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -155,6 +157,52 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 }
 
+REQUEST_LOG_BUFFER = {
+    'MAX_SIZE': 10000,
+    'FLUSH_SIZE': 200,
+    'FLUSH_INTERVAL': 5,
+}
+
+REDIS_URL = env('REDIS_URL', default=None)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+PRODUCT_ACCESS_CACHE_TIMEOUT = 60 * 60
+
+# milliseconds a bill waits for the rows of hot products before giving up, 0 waits forever
+INVENTORY_LOCK_TIMEOUT = env.int('INVENTORY_LOCK_TIMEOUT', default=2000)
+
+# resolved permissions are kept per process for LOCAL_TIMEOUT seconds and in the shared cache for TIMEOUT,
+# without a cache shared by all workers only the short local copy is used
+PERMISSION_CACHE = {
+    'TIMEOUT': 60 * 60,
+    'LOCAL_TIMEOUT': 30,
+    'LOCAL_SIZE': 10000,
+    'SHARED': env.bool('PERMISSION_CACHE_SHARED', default=bool(REDIS_URL)),
+}
+
+# build request.user from the access token claims instead of loading it on every request
+JWT_STATELESS_AUTH = env.bool('JWT_STATELESS_AUTH', default=False)
+
+BILL_CODE_FORMAT = 'vafa_{id}_{date:%Y%m%d%H%M%S}'
+
+REQUEST_LOG_RETENTION_MONTHS = 6
+REQUEST_LOG_PARTITIONS_AHEAD = 3
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
@@ -188,6 +236,8 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_OBTAIN_SERIALIZER': 'users.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.ClaimsTokenRefreshSerializer',
 
     'JTI_CLAIM': 'jti',
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class StatinfoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'statInfo'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,115 @@
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from users.models import User, Notification, Ticket, Turn
+from bills.models import Bill, BillProduct, Category, Product
+from bills.codes import allocate_ids, can_allocate_ids, format_bill_code
+from bills.pricing import line_total
+from .revenue import revenue_per, revenue_per_month, debt_aging
+
+PAGE_SIZE = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+# the list endpoints as the viewsets build them, limited to the first page
+QUERIES = {
+    'sub_users': lambda admin: User.objects.filter(admin=admin),
+    'bills': lambda admin: Bill.objects.filter(tenant=admin),
+    'tickets': lambda admin: Ticket.objects.filter(Q(tenant=admin) | Q(tenant=admin.admin)),
+    'turns': lambda admin: Turn.objects.filter(Q(tenant=admin) | Q(tenant=admin.admin)),
+    'notifications': lambda admin: Notification.objects.filter(user=admin),
+    'categories': lambda admin: Category.objects.filter(Q(user=admin) | Q(user=admin.admin)),
+    'products': lambda admin: Product.objects.filter(Q(user=admin) | Q(tenant=admin)),
+    'upcoming_turns': lambda admin: Turn.objects.filter(
+        date_visit__gt=timezone.now(), date_visit__lte=timezone.now()+timedelta(hours=3)).order_by('date_visit'),
+    'revenue_per_month': lambda admin: revenue_per_month(admin, timezone.now()-timedelta(days=365)),
+    'revenue_per_seller': lambda admin: revenue_per(admin, 'seller', timezone.now()-timedelta(days=365)),
+    'revenue_per_category': lambda admin: revenue_per(admin, 'category', timezone.now()-timedelta(days=365)),
+    'revenue_per_product': lambda admin: revenue_per(admin, 'product', timezone.now()-timedelta(days=365)),
+    'debt_aging': debt_aging,
+}
+
+INDEXED_MODELS = [User, Notification, Ticket, Turn, Bill, Category, Product]
+
+
+def spread(objects, field, days):
+    now = timezone.now()
+    for item in objects:
+        setattr(item, field, now - timedelta(seconds=random.randint(0, days*86400)))
+
+
+def seed(admins=10, users=200, bills=5, tickets=1, turns=1, notifications=5, days=365, batch_size=2000):
+    prefix = 'bench_{}_'.format(timezone.now().strftime('%Y%m%d%H%M%S'))
+    password = make_password(None)
+    with transaction.atomic():
+        admin_rows = User.objects.bulk_create([User(
+            username='{}{}'.format(prefix, i), password=password) for i in range(admins)], batch_size=batch_size)
+        categories = Category.objects.bulk_create(
+            [Category(name='bench', user=admin) for admin in admin_rows], batch_size=batch_size)
+        products = Product.objects.bulk_create([Product(name='bench', user=admin, category=category, tenant=admin, price=1000, last_price=1000,
+                                                        discount=0) for admin, category in zip(admin_rows, categories)], batch_size=batch_size)
+        admin_products = {product.user_id: product for product in products}
+        customers = [User(username='{}{}_{}'.format(prefix, admin.id, i), password=password, admin=admin)
+                     for admin in admin_rows for i in range(users)]
+        spread(customers, 'date_joined', days)
+        customers = User.objects.bulk_create(customers, batch_size=batch_size)
+
+        bill_rows = [Bill(user=customer, tenant=customer.admin, creator=customer.admin, cash_payment=random.randint(1, 100)*1000,
+                          debt=random.choice([0, 0, 0, 500, 2000]))
+                     for customer in customers for i in range(bills)]
+        # one line item per bill, the totals are stored the way the pricing signals would
+        line_rows = [BillProduct(bill=bill, product=admin_products[bill.tenant.id], seller=bill.tenant, number=random.randint(1, 5),
+                                 unit_price=1000, discount=random.choice([0, 10])) for bill in bill_rows]
+        for bill, line in zip(bill_rows, line_rows):
+            line.line_total = line_total(line.unit_price, line.discount, line.number)
+            bill.total, bill.discount_total = line.line_total, line.unit_price*line.number - line.line_total
+            bill.balance = bill.total - bill.cash_payment - bill.debt
+        if can_allocate_ids(connection.alias):
+            for bill, bill_id in zip(bill_rows, allocate_ids(Bill, len(bill_rows))):
+                bill.id, bill.code = bill_id, format_bill_code(bill_id)
+        rows = {
+            Bill: bill_rows,
+            Ticket: [Ticket(user=customer, tenant=customer.admin, subject='bench', text='bench')
+                     for customer in customers for i in range(tickets)],
+            Turn: [Turn(user=customer, tenant=customer.admin, date_visit=timezone.now()+timedelta(minutes=random.randint(-days*1440, days*1440)))
+                   for customer in customers for i in range(turns)],
+            Notification: [Notification(user=customer, text='bench')
+                           for customer in customers for i in range(notifications)],
+        }
+        for model, objects in rows.items():
+            model.objects.bulk_create(objects, batch_size=batch_size)
+            # auto_now_add stamps every row with now, spread them afterwards
+            spread(objects, 'date_created', days)
+            model.objects.bulk_update(
+                objects, ['date_created'], batch_size=batch_size)
+        BillProduct.objects.bulk_create(line_rows, batch_size=batch_size)
+    if connection.vendor == 'postgresql':
+        # refresh the planner statistics so the plans reflect the new data
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return {model._meta.label: len(objects) for model, objects in rows.items()} | {
+        'users.User': len(customers)+admins, 'bills.BillProduct': len(line_rows)}
+
+
+def explain(name, admin, analyze=False):
+    queryset = QUERIES[name](admin)[:PAGE_SIZE]
+    if analyze and connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True)
+    return queryset.explain()
+
+
+def explain_all(admin, names=None, analyze=False, without_indexes=False):
+    names = names or list(QUERIES)
+    if not without_indexes:
+        return {name: explain(name, admin, analyze) for name in names}
+    # drop the composite indexes inside a transaction which is rolled back afterwards
+    with transaction.atomic():
+        with connection.schema_editor(atomic=False) as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        plans = {name: explain(name, admin, analyze) for name in names}
+        transaction.set_rollback(True)
+    return plans
@@ -0,0 +1,159 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+from datetime import timedelta
+from collections import Counter
+from users.models import User
+from bills.models import Bill
+from .models import DailyStatistic
+from crm import response_cache
+
+# counts of rows, a delete reaching a row rebuilt after the row was counted stops at zero
+COUNTERS = ('users_joined', 'users_with_bills', 'bills_created')
+
+
+def bill_amount(bill):
+    return int(bill.cash_payment) + int(bill.used_credit) + int(bill.debt)
+
+
+def add_daily(admin_id, day, **deltas):
+    updates = {name: Greatest(F(name)+value, 0) if name in COUNTERS else F(name)+value
+               for name, value in deltas.items() if value}
+    if not updates:
+        return
+    response_cache.refresh('statistics', [admin_id])
+    if DailyStatistic.objects.filter(admin_id=admin_id, day=day).update(**updates):
+        return
+    # users and bills deleted with their admin are counted after its row is gone
+    if not User.objects.filter(pk=admin_id).exists():
+        return
+    try:
+        with transaction.atomic():
+            DailyStatistic.objects.create(admin_id=admin_id, day=day, **{
+                name: max(value, 0) if name in COUNTERS else value for name, value in deltas.items()})
+    except IntegrityError:
+        DailyStatistic.objects.filter(
+            admin_id=admin_id, day=day).update(**updates)
+
+
+def register_user(user):
+    if user.admin_id:
+        add_daily(user.admin_id, timezone.localdate(
+            user.date_joined), users_joined=1)
+
+
+def register_bill(bill):
+    user = bill.user
+    if not user.admin_id:
+        return
+    add_daily(user.admin_id, timezone.localdate(bill.date_created), bills_created=1,
+              bill_revenue=bill_amount(bill), debt_issued=int(bill.debt))
+    if not Bill.objects.filter(user_id=user.id).exclude(pk=bill.pk).exists():
+        add_daily(user.admin_id, timezone.localdate(
+            user.date_joined), users_with_bills=1)
+
+
+def unregister_bill(bill):
+    if not bill.tenant_id:
+        return
+    add_daily(bill.tenant_id, timezone.localdate(bill.date_created), bills_created=-1,
+              bill_revenue=-bill_amount(bill), debt_issued=-int(bill.debt))
+    if not Bill.objects.filter(user_id=bill.user_id).exists():
+        # deletes send post_delete after the whole batch is gone, so count instead of subtracting
+        recount_customer(bill.user_id)
+
+
+def recount_customer(user_id):
+    user = User.objects.filter(pk=user_id).values('admin_id', 'date_joined').first()
+    if user and user['admin_id']:
+        recount_users_with_bills(user['admin_id'], timezone.localdate(user['date_joined']))
+
+
+def recount_users_with_bills(admin_id, day):
+    with_bills = User.objects.filter(admin_id=admin_id, date_joined__date=day,
+                                     personal_bills__isnull=False).distinct().count()
+    DailyStatistic.objects.update_or_create(admin_id=admin_id, day=day, defaults={'users_with_bills': with_bills})
+    response_cache.refresh('statistics', [admin_id])
+
+
+def register_bill_change(bill, tenant_id, user_id, cash_payment, used_credit, debt, total):
+    day = timezone.localdate(bill.date_created)
+    amount = int(cash_payment) + int(used_credit) + int(debt)
+    if tenant_id == bill.tenant_id:
+        if bill.tenant_id:
+            add_daily(bill.tenant_id, day, bill_revenue=bill_amount(bill)-amount,
+                      debt_issued=int(bill.debt)-int(debt))
+    else:
+        # the bill went to another tenant with its user, its counts go along
+        if tenant_id:
+            add_daily(tenant_id, day, bills_created=-1, bill_revenue=-amount,
+                      debt_issued=-int(debt), sales_total=-int(total))
+        if bill.tenant_id:
+            add_daily(bill.tenant_id, day, bills_created=1, bill_revenue=bill_amount(bill),
+                      debt_issued=int(bill.debt), sales_total=int(total))
+    if user_id != bill.user_id:
+        recount_customer(user_id)
+        recount_customer(bill.user_id)
+
+
+def unregister_user(user):
+    if user.admin_id:
+        add_daily(user.admin_id, timezone.localdate(
+            user.date_joined), users_joined=-1)
+
+
+def register_bill_totals(changes):
+    sales = Counter()
+    for bill_id, tenant_id, date_created, delta in changes:
+        if tenant_id:
+            sales[tenant_id, timezone.localdate(date_created)] += delta
+    for (admin_id, day), delta in sales.items():
+        add_daily(admin_id, day, sales_total=delta)
+
+
+def reconcile(start=None, end=None, admin_ids=None):
+    end = end or timezone.localdate()
+    users = User.objects.filter(admin__isnull=False)
+    bills = Bill.objects.filter(tenant__isnull=False)
+    stats = DailyStatistic.objects.all()
+    if start:
+        users = users.filter(date_joined__date__gte=start)
+        bills = bills.filter(date_created__date__gte=start)
+        stats = stats.filter(day__gte=start)
+    users = users.filter(date_joined__date__lte=end)
+    bills = bills.filter(date_created__date__lte=end)
+    stats = stats.filter(day__lte=end)
+    if admin_ids is not None:
+        users = users.filter(admin__in=admin_ids)
+        bills = bills.filter(tenant__in=admin_ids)
+        stats = stats.filter(admin__in=admin_ids)
+
+    rows = {}
+
+    def row(admin_id, day):
+        return rows.setdefault((admin_id, day), DailyStatistic(admin_id=admin_id, day=day))
+
+    for item in users.annotate(day=TruncDate('date_joined')).order_by().values('admin', 'day').annotate(
+            joined=Count('pk', distinct=True), with_bills=Count('personal_bills__user', distinct=True)):
+        statistic = row(item['admin'], item['day'])
+        statistic.users_joined = item['joined']
+        statistic.users_with_bills = item['with_bills']
+    for item in bills.annotate(day=TruncDate('date_created')).order_by().values('tenant', 'day').annotate(
+            created=Count('pk'), revenue=Sum(F('cash_payment')+F('used_credit')+F('debt')), debt=Sum('debt'),
+            sales=Sum('total')):
+        statistic = row(item['tenant'], item['day'])
+        statistic.bills_created = item['created']
+        statistic.bill_revenue = item['revenue'] or 0
+        statistic.debt_issued = item['debt'] or 0
+        statistic.sales_total = item['sales'] or 0
+
+    with transaction.atomic():
+        stats.delete()
+        DailyStatistic.objects.bulk_create(rows.values(), batch_size=1000)
+    response_cache.refresh('statistics', admin_ids)
+    return len(rows)
+
+
+def reconcile_recent(days=2):
+    return reconcile(start=timezone.localdate()-timedelta(days=days))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from users.models import User
+from statInfo.benchmark import QUERIES, seed, explain_all
+
+
+class Command(BaseCommand):
+    help = 'Show query plans of the tenant scoped list and revenue endpoints, optionally on seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='create given number of admins with generated users, bills with line items, tickets, turns and notifications')
+        parser.add_argument('--users', type=int, default=200,
+                            help='generated users per seeded admin')
+        parser.add_argument('--admin', type=int,
+                            help='admin id to run the queries for, defaults to the admin with most users')
+        parser.add_argument('--query', action='append', choices=list(QUERIES),
+                            help='only explain given queries')
+        parser.add_argument('--analyze', action='store_true',
+                            help='run the queries and show actual timings')
+        parser.add_argument('--compare', action='store_true',
+                            help='also show the plans without the composite indexes')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            counts = seed(admins=options['seed'], users=options['users'])
+            self.stdout.write(self.style.SUCCESS('seeded {}'.format(
+                ', '.join('{} {}'.format(count, label) for label, count in counts.items()))))
+        if options['admin']:
+            admin = User.objects.get(pk=options['admin'])
+        else:
+            admin = User.objects.annotate(sub_users=Count(
+                'subUsers')).order_by('-sub_users').first()
+        if admin is None:
+            raise CommandError('there is no user to run the queries for')
+
+        plans = [('with indexes', explain_all(
+            admin, options['query'], options['analyze']))]
+        if options['compare']:
+            plans.append(('without indexes', explain_all(
+                admin, options['query'], options['analyze'], without_indexes=True)))
+        for title, results in plans:
+            for name, plan in results.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    '{} ({})'.format(name, title)))
+                self.stdout.write(plan)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from statInfo.daily import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per admin daily statistics from bills and users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0,
+                            help='only rebuild the last given days, 0 rebuilds everything')
+        parser.add_argument('--admin', type=int, action='append',
+                            help='only rebuild statistics of given admin ids')
+
+    def handle(self, *args, **options):
+        start = timezone.localdate() - \
+            timedelta(days=options['days']) if options['days'] else None
+        count = reconcile(start=start, admin_ids=options['admin'])
+        self.stdout.write(self.style.SUCCESS(
+            'rebuilt {} daily statistics'.format(count)))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from crm import response_cache
+
+SCOPES = ['products', 'categories', 'statistics']
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counters of the cached list responses'
+
+    def handle(self, *args, **options):
+        for scope, counters in response_cache.stats(SCOPES).items():
+            total = counters['hits'] + counters['misses']
+            self.stdout.write('{}: {} hits, {} misses, {:.0%} hit rate'.format(
+                scope, counters['hits'], counters['misses'], counters['hits']/total if total else 0))
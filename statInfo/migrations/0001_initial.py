@@ -0,0 +1,38 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('users_joined', models.PositiveIntegerField(default=0)),
+                ('users_with_bills', models.PositiveIntegerField(default=0)),
+                ('bills_created', models.PositiveIntegerField(default=0)),
+                ('bill_revenue', models.BigIntegerField(default=0)),
+                ('debt_issued', models.BigIntegerField(default=0)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('admin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dailyStatistics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystatistic',
+            constraint=models.UniqueConstraint(fields=('admin', 'day'), name='statinfo_daily_admin_day_uniq'),
+        ),
+    ]
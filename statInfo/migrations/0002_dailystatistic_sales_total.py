@@ -0,0 +1,31 @@
+# Generated by Django 4.0.6 on 2026-10-18 23:45
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_sales_total(apps, schema_editor):
+    Bill = apps.get_model('bills', 'Bill')
+    DailyStatistic = apps.get_model('statInfo', 'DailyStatistic')
+    for item in Bill.objects.filter(tenant__isnull=False).annotate(day=TruncDate('date_created')).order_by().values(
+            'tenant', 'day').annotate(sales=Sum('total')):
+        DailyStatistic.objects.update_or_create(admin_id=item['tenant'], day=item['day'],
+                                                defaults={'sales_total': item['sales'] or 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0012_bill_totals'),
+        ('statInfo', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystatistic',
+            name='sales_total',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_sales_total, migrations.RunPython.noop),
+    ]
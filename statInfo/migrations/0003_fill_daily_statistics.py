@@ -0,0 +1,45 @@
+# Generated by Django 4.0.6 on 2026-10-18 23:55
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_statistics(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Bill = apps.get_model('bills', 'Bill')
+    DailyStatistic = apps.get_model('statInfo', 'DailyStatistic')
+    rows = {}
+
+    def row(admin_id, day):
+        return rows.setdefault((admin_id, day), DailyStatistic(admin_id=admin_id, day=day))
+
+    for item in User.objects.filter(admin__isnull=False).annotate(day=TruncDate('date_joined')).order_by().values(
+            'admin', 'day').annotate(joined=Count('pk', distinct=True),
+                                     with_bills=Count('personal_bills__user', distinct=True)):
+        statistic = row(item['admin'], item['day'])
+        statistic.users_joined = item['joined']
+        statistic.users_with_bills = item['with_bills']
+    for item in Bill.objects.filter(tenant__isnull=False).annotate(day=TruncDate('date_created')).order_by().values(
+            'tenant', 'day').annotate(created=Count('pk'), revenue=Sum(F('cash_payment')+F('used_credit')+F('debt')),
+                                      debt=Sum('debt'), sales=Sum('total')):
+        statistic = row(item['tenant'], item['day'])
+        statistic.bills_created = item['created']
+        statistic.bill_revenue = item['revenue'] or 0
+        statistic.debt_issued = item['debt'] or 0
+        statistic.sales_total = item['sales'] or 0
+    DailyStatistic.objects.all().delete()
+    DailyStatistic.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0013_product_tenant_from_path'),
+        ('users', '0026_tenant'),
+        ('statInfo', '0002_dailystatistic_sales_total'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_daily_statistics, migrations.RunPython.noop),
+    ]
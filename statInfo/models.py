@@ -1,3 +1,21 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyStatistic(models.Model):
+    admin = models.ForeignKey(
+        'users.User', models.CASCADE, related_name='dailyStatistics')
+    day = models.DateField()
+    users_joined = models.PositiveIntegerField(default=0)
+    users_with_bills = models.PositiveIntegerField(default=0)
+    bills_created = models.PositiveIntegerField(default=0)
+    bill_revenue = models.BigIntegerField(default=0)
+    debt_issued = models.BigIntegerField(default=0)
+    sales_total = models.BigIntegerField(default=0)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['admin', 'day'], name='statinfo_daily_admin_day_uniq'),
+        ]
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from django.db.models import BigIntegerField, Case, Count, F, Func, Min, Q, Sum, Value, When, Window
+from django.db.models.functions import Rank, TruncMonth
+from django.utils import timezone
+from bills.models import Bill, BillProduct
+from .rollups import _as_date, bucket_range
+
+# group field and label field of every revenue breakdown
+BREAKDOWNS = {
+    'seller': ('seller', 'seller__username'),
+    'category': ('product__category', 'product__category__name'),
+    'product': ('product', 'product__name'),
+}
+
+# label and the last day of age of each bucket, the last bucket is open ended
+AGING_BUCKETS = [('0-30', 30), ('31-60', 60), ('61-90', 90), ('91+', None)]
+
+
+class SumOver(Func):
+    # SUM used as a window function over the grouped rows
+    function = 'SUM'
+    window_compatible = True
+
+
+def period(queryset, field, start=None, end=None):
+    if start:
+        queryset = queryset.filter(**{field+'__gte': start})
+    if end:
+        queryset = queryset.filter(**{field+'__lte': end})
+    return queryset
+
+
+def revenue_per_month(admin, start=None, end=None):
+    months = period(Bill.objects.filter(tenant=admin), 'date_created', start, end).annotate(
+        month=TruncMonth('date_created')).order_by().values('month')
+    return months.annotate(
+        bills=Count('pk'), revenue=Sum('total'), discounts=Sum('discount_total'),
+        paid=Sum(F('cash_payment')+F('used_credit')), debt=Sum('debt'),
+        cumulative=Window(SumOver(Sum('total'), output_field=BigIntegerField()), order_by=F('month').asc())
+    ).order_by('month')
+
+
+def revenue_per(admin, breakdown, start=None, end=None):
+    group, label = BREAKDOWNS[breakdown]
+    lines = period(BillProduct.objects.filter(bill__tenant=admin), 'bill__date_created', start, end)
+    return lines.order_by().values(group, label).annotate(
+        items=Sum('number'), lines=Count('pk'), revenue=Sum('line_total'),
+        discounts=Sum(F('unit_price')*F('number')-F('line_total'), output_field=BigIntegerField()),
+        rank=Window(Rank(), order_by=Sum('line_total').desc()),
+        period_revenue=Window(SumOver(Sum('line_total'), output_field=BigIntegerField()))
+    ).order_by('rank', F(group).asc())
+
+
+def debt_aging(admin, as_of=None):
+    as_of = as_of or timezone.now()
+    age = Case(*[When(date_created__gt=as_of-timedelta(days=days+1), then=Value(name))
+                 for name, days in AGING_BUCKETS if days is not None], default=Value(AGING_BUCKETS[-1][0]))
+    return Bill.objects.filter(Q(debt__gt=0) | Q(used_credit__gt=0), tenant=admin, date_created__lte=as_of).annotate(
+        age=age).order_by().values('age').annotate(
+        bills=Count('pk'), debt=Sum('debt'), used_credit=Sum('used_credit'), oldest=Min('date_created'))
+
+
+def month_rows(rows, start, end):
+    found = {_as_date(row['month']): row for row in rows}
+    months, cumulative = [], 0
+    for month in bucket_range(start, end, 'month'):
+        row = found.get(month.date())
+        if row:
+            cumulative = row['cumulative'] or 0
+        months.append({'month': month.date(), 'bills': row['bills'] if row else 0, 'cumulative': cumulative,
+                       **{name: (row[name] or 0) if row else 0 for name in ['revenue', 'discounts', 'paid', 'debt']}})
+    return months
+
+
+def breakdown_rows(rows, breakdown):
+    group, label = BREAKDOWNS[breakdown]
+    return [{'id': row[group], 'name': row[label], 'rank': row['rank'], 'items': row['items'] or 0,
+             'lines': row['lines'], 'revenue': row['revenue'] or 0, 'discounts': row['discounts'] or 0,
+             'share': round(100*row['revenue']/row['period_revenue'], 2) if row['period_revenue'] else 0}
+            for row in rows]
+
+
+def aging_rows(rows):
+    found = {row['age']: row for row in rows}
+    empty = {'bills': 0, 'debt': 0, 'used_credit': 0, 'oldest': None}
+    return [{'age': name, **{key: found.get(name, empty)[key] for key in empty}} for name, days in AGING_BUCKETS]
@@ -0,0 +1,65 @@
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter
+from django.utils import timezone
+from datetime import datetime, timedelta
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+
+def bucket_start(value, bucket='month'):
+    value = timezone.localtime(value) if timezone.is_aware(value) else value
+    day = value.date()
+    if bucket == 'week':
+        day -= timedelta(days=day.weekday())
+    elif bucket == 'month':
+        day = day.replace(day=1)
+    elif bucket == 'quarter':
+        day = day.replace(month=(day.month-1)//3*3+1, day=1)
+    elif bucket != 'day':
+        raise ValueError('unknown bucket {}'.format(bucket))
+    return timezone.make_aware(datetime(day.year, day.month, day.day))
+
+
+def shift_bucket(start, bucket='month', steps=1):
+    if bucket == 'day':
+        return timezone.make_aware(datetime.combine(start.date()+timedelta(days=steps), datetime.min.time()))
+    if bucket == 'week':
+        return timezone.make_aware(datetime.combine(start.date()+timedelta(weeks=steps), datetime.min.time()))
+    months = steps*3 if bucket == 'quarter' else steps
+    month_index = start.year*12 + start.month-1 + months
+    return timezone.make_aware(datetime(month_index//12, month_index % 12+1, 1))
+
+
+def bucket_range(start, end, bucket='month'):
+    current = bucket_start(start, bucket)
+    while current <= end:
+        yield current
+        current = shift_bucket(current, bucket)
+
+
+def last_buckets(count, bucket='month', until=None):
+    until = until or timezone.now()
+    end = bucket_start(until, bucket)
+    return shift_bucket(end, bucket, -(count-1)), until
+
+
+def aggregate_per_bucket(queryset, field, start, end, bucket='month', value=None):
+    if bucket not in BUCKETS:
+        raise ValueError('unknown bucket {}'.format(bucket))
+    value = value if value is not None else Count('pk')
+    rows = queryset.filter(**{field+'__gte': bucket_start(start, bucket), field+'__lte': end}
+                           ).annotate(bucket=BUCKETS[bucket](field)
+                                      ).order_by().values('bucket').annotate(value=value).values_list('bucket', 'value')
+    values = {_as_date(key): result for key, result in rows}
+    return [(key.date(), values.get(key.date()) or 0) for key in bucket_range(start, end, bucket)]
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
@@ -0,0 +1,82 @@
+from django.dispatch import receiver
+from collections import Counter
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save, pre_save
+from users.models import User
+from users.signals import users_bulk_created
+from bills.models import Bill
+from bills.signals import bills_imported, bill_totals_changed
+from crm import response_cache
+from .models import DailyStatistic
+from .daily import (add_daily, reconcile, register_bill, register_bill_change, register_bill_totals,
+                    recount_users_with_bills, register_user, unregister_bill, unregister_user)
+
+AMOUNT_FIELDS = ('cash_payment', 'used_credit', 'debt')
+CHANGE_FIELDS = AMOUNT_FIELDS + ('user', 'user_id')
+
+
+@receiver(post_save, sender=User)
+def count_created_user(sender, **kwargs):
+    if kwargs['created'] and not kwargs.get('raw'):
+        register_user(kwargs['instance'])
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, **kwargs):
+    # rows its own users and bills counted while they were deleted go with the admin
+    DailyStatistic.objects.filter(admin_id=kwargs['instance'].pk).delete()
+    unregister_user(kwargs['instance'])
+
+
+@receiver(pre_save, sender=Bill)
+def remember_bill_amounts(sender, **kwargs):
+    instance, update_fields = kwargs['instance'], kwargs.get('update_fields')
+    instance._saved_amounts = None
+    if instance._state.adding or kwargs.get('raw'):
+        return
+    if update_fields is None or set(CHANGE_FIELDS) & set(update_fields):
+        instance._saved_amounts = Bill.objects.filter(pk=instance.pk).values_list(*AMOUNT_FIELDS, 'total').first()
+
+
+@receiver(post_save, sender=Bill)
+def count_created_bill(sender, **kwargs):
+    instance = kwargs['instance']
+    if kwargs['created'] and not kwargs.get('raw'):
+        register_bill(instance)
+    elif not kwargs.get('raw'):
+        if getattr(instance, '_saved_amounts', None):
+            owners = getattr(instance, '_loaded_owners', (instance.tenant_id, instance.user_id))
+            register_bill_change(instance, *owners, *instance._saved_amounts)
+        # payments changed, the revenue and aging responses read them directly
+        response_cache.refresh('statistics', [instance.tenant_id])
+    instance._loaded_owners = (instance.tenant_id, instance.user_id)
+
+
+@receiver(post_delete, sender=Bill)
+def count_deleted_bill(sender, **kwargs):
+    unregister_bill(kwargs['instance'])
+
+
+@receiver(bills_imported)
+def count_imported_bills(sender, **kwargs):
+    # imported bills skip post_save, so rebuild the days they were created on
+    start, end = min(kwargs['days']), max(kwargs['days'])
+    reconcile(start=start, end=end, admin_ids=list(kwargs['tenant_ids']))
+    # customers who joined earlier may have got their first bill
+    joined = User.objects.filter(id__in=kwargs['user_ids'], admin__isnull=False).exclude(
+        date_joined__date__range=(start, end)).values_list('admin_id', 'date_joined')
+    for admin_id, day in {(admin_id, timezone.localdate(date_joined)) for admin_id, date_joined in joined}:
+        recount_users_with_bills(admin_id, day)
+
+
+@receiver(users_bulk_created)
+def count_bulk_created_users(sender, **kwargs):
+    joined = Counter((user.admin_id, timezone.localdate(user.date_joined))
+                     for user in kwargs['users'] if user.admin_id)
+    for (admin_id, day), count in joined.items():
+        add_daily(admin_id, day, users_joined=count)
+
+
+@receiver(bill_totals_changed)
+def count_bill_totals(sender, **kwargs):
+    register_bill_totals(kwargs['changes'])
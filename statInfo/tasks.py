@@ -0,0 +1,7 @@
+from celery import shared_task
+from .daily import reconcile_recent
+
+
+@shared_task(name='reconcile_daily_statistics')
+def reconcile_daily_statistics(days=2):
+    return reconcile_recent(days)
@@ -2,6 +2,18 @@ from django.test import TestCase
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import Permission, Group
 from users.models import User
+from bills.models import Bill, BillProduct, Category, Product
+from django.utils import timezone
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
+from django.db import transaction
+from django.apps import apps
+from .rollups import aggregate_per_bucket, last_buckets
+from .models import DailyStatistic
+from .daily import reconcile
+from .benchmark import QUERIES, seed, explain_all
+from .revenue import revenue_per
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -52,3 +64,264 @@ class UserStatisticsTest(SetUpTestCase):
         r_user_stat_get = self.client.get(
             '/api/statInfo/userStatistics/per_month_created_user', format='json')
         self.assertEqual(r_user_stat_get.status_code, 200)
+
+    def test_can_get_users_has_bill_per_month(self):
+        Bill.objects.create(
+            cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+        super()._jwt_auth(self.u_admin)
+        r_user_stat_get = self.client.get(
+            '/api/statInfo/userStatistics/per_month_users_has_bill', format='json')
+        self.assertEqual(r_user_stat_get.status_code, 200)
+        self.assertEqual(r_user_stat_get.data[0], 1)
+
+
+class BillStatisticsTest(SetUpTestCase):
+    def setUp(self):
+        super().setUp()
+        self.u_admin.user_permissions.set(
+            Permission.objects.filter(codename='view_bill'))
+        for i in range(3):
+            Bill.objects.create(
+                cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+
+    def test_can_get_bills_per_month(self):
+        super()._jwt_auth(self.u_admin)
+        r_bill_stat_get = self.client.get(
+            '/api/statInfo/billStatistics/per_month_created_bill', format='json')
+        self.assertEqual(r_bill_stat_get.status_code, 200)
+        self.assertEqual(len(r_bill_stat_get.data), 12)
+        self.assertEqual(r_bill_stat_get.data[0], 3)
+        self.assertEqual(sum(r_bill_stat_get.data), 3)
+
+    def test_can_get_bills_per_day(self):
+        super()._jwt_auth(self.u_admin)
+        r_bill_stat_get = self.client.get(
+            '/api/statInfo/billStatistics/per_month_created_bill', {'bucket': 'day', 'count': 30}, format='json')
+        self.assertEqual(r_bill_stat_get.status_code, 200)
+        self.assertEqual(len(r_bill_stat_get.data), 30)
+        self.assertEqual(r_bill_stat_get.data[0], 3)
+
+    def test_cant_get_bills_with_unknown_bucket(self):
+        super()._jwt_auth(self.u_admin)
+        r_bill_stat_get = self.client.get(
+            '/api/statInfo/billStatistics/per_month_created_bill', {'bucket': 'decade'}, format='json')
+        self.assertEqual(r_bill_stat_get.status_code, 400)
+
+    def test_cant_get_too_many_buckets(self):
+        super()._jwt_auth(self.u_admin)
+        url = '/api/statInfo/billStatistics/per_month_created_bill'
+        for params in [{'count': 0}, {'count': 367}, {'bucket': 'day', 'start': '1900-01-01'}]:
+            self.assertEqual(self.client.get(url, params, format='json').status_code, 400)
+        r_bill_stat_get = self.client.get(url, {'bucket': 'day', 'count': 366}, format='json')
+        self.assertEqual(r_bill_stat_get.status_code, 200)
+        self.assertEqual(len(r_bill_stat_get.data), 366)
+
+    def test_bill_statistics_are_cached_until_next_bill(self):
+        super()._jwt_auth(self.u_admin)
+        url = '/api/statInfo/billStatistics/per_month_created_bill'
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'HIT')
+        Bill.objects.create(
+            cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+        r_bill_stat_get = self.client.get(url, format='json')
+        self.assertEqual(r_bill_stat_get['X-Cache'], 'MISS')
+        self.assertEqual(r_bill_stat_get.data[0], 4)
+
+    def test_bills_per_month_uses_single_query(self):
+        bills = Bill.objects.filter(user__admin=self.u_admin)
+        start, end = last_buckets(12)
+        with self.assertNumQueries(1):
+            counts = aggregate_per_bucket(bills, 'date_created', start, end)
+        self.assertEqual(len(counts), 12)
+        self.assertEqual(counts[-1][1], 3)
+
+
+class DailyStatisticTest(SetUpTestCase):
+    def test_bill_creation_updates_daily_statistic(self):
+        Bill.objects.create(cash_payment=1000, debt=500,
+                            code='test', user=self.u_end, creator=self.u_admin)
+        Bill.objects.create(cash_payment=2000, code='test',
+                            user=self.u_end, creator=self.u_admin)
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.users_joined, 3)
+        self.assertEqual(statistic.users_with_bills, 1)
+        self.assertEqual(statistic.bills_created, 2)
+        self.assertEqual(statistic.bill_revenue, 3500)
+        self.assertEqual(statistic.debt_issued, 500)
+
+    def test_reconcile_rebuilds_daily_statistic(self):
+        Bill.objects.create(cash_payment=1000, debt=500,
+                            code='test', user=self.u_end, creator=self.u_admin)
+        DailyStatistic.objects.all().delete()
+        reconcile()
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.users_joined, 3)
+        self.assertEqual(statistic.users_with_bills, 1)
+        self.assertEqual(statistic.bills_created, 1)
+        self.assertEqual(statistic.bill_revenue, 1500)
+
+
+    def test_deletes_and_edits_update_daily_statistic(self):
+        first = Bill.objects.create(cash_payment=1000, debt=500,
+                                    code='test', user=self.u_end, creator=self.u_admin)
+        Bill.objects.create(cash_payment=2000, code='test',
+                            user=self.u_end, creator=self.u_admin)
+        first.cash_payment = 1500
+        first.save()
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.bill_revenue, 4000)
+        self.assertEqual(statistic.debt_issued, 500)
+        first.delete()
+        statistic.refresh_from_db()
+        self.assertEqual(statistic.bills_created, 1)
+        self.assertEqual(statistic.bill_revenue, 2000)
+        self.assertEqual(statistic.debt_issued, 0)
+        self.assertEqual(statistic.users_with_bills, 1)
+        self.u_end.delete()
+        statistic.refresh_from_db()
+        self.assertEqual(statistic.users_joined, 2)
+        self.assertEqual(statistic.users_with_bills, 0)
+        self.assertEqual(statistic.bills_created, 0)
+        self.assertEqual(statistic.bill_revenue, 0)
+
+    def test_failed_admin_delete_keeps_counting(self):
+        Bill.objects.create(cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic(), mock.patch('statInfo.signals.unregister_bill', side_effect=RuntimeError):
+                self.u_admin.delete()
+        Bill.objects.create(cash_payment=2000, code='test', user=self.u_end, creator=self.u_admin)
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.bills_created, 2)
+        self.assertEqual(statistic.bill_revenue, 3000)
+
+    def test_admin_delete_removes_its_statistics(self):
+        Bill.objects.create(cash_payment=1000, code='test', user=self.u_end, creator=self.u_admin)
+        self.u_admin.delete()
+        self.assertFalse(DailyStatistic.objects.exists())
+
+    def test_bill_moved_to_other_tenant_moves_statistics(self):
+        u_other = User.objects.create(username='u_other', password='mmmmm46456456456')
+        u_other_end = User.objects.create(
+            username='u_other_end', password='mmmmm46456456456', admin=u_other)
+        bill = Bill.objects.create(cash_payment=1000, debt=500,
+                                   code='test', user=self.u_end, creator=self.u_admin)
+        bill = Bill.objects.get(pk=bill.pk)
+        bill.user = u_other_end
+        bill.save()
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.bills_created, 0)
+        self.assertEqual(statistic.bill_revenue, 0)
+        self.assertEqual(statistic.users_with_bills, 0)
+        statistic = DailyStatistic.objects.get(
+            admin=u_other, day=timezone.localdate())
+        self.assertEqual(statistic.bills_created, 1)
+        self.assertEqual(statistic.bill_revenue, 1500)
+        self.assertEqual(statistic.debt_issued, 500)
+        self.assertEqual(statistic.users_with_bills, 1)
+
+    def test_migration_fills_daily_statistic(self):
+        Bill.objects.create(cash_payment=1000, debt=500,
+                            code='test', user=self.u_end, creator=self.u_admin)
+        DailyStatistic.objects.all().delete()
+        import_module('statInfo.migrations.0003_fill_daily_statistics').fill_daily_statistics(apps, None)
+        statistic = DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate())
+        self.assertEqual(statistic.users_joined, 3)
+        self.assertEqual(statistic.users_with_bills, 1)
+        self.assertEqual(statistic.bills_created, 1)
+        self.assertEqual(statistic.bill_revenue, 1500)
+
+
+class BenchmarkTest(SetUpTestCase):
+    def test_seed_and_explain_queries(self):
+        counts = seed(admins=1, users=3, bills=2)
+        self.assertEqual(counts['bills.Bill'], 6)
+        self.assertEqual(counts['users.User'], 4)
+        admin = User.objects.get(username__startswith='bench_', admin=None)
+        plans = explain_all(admin)
+        self.assertEqual(set(plans), set(QUERIES))
+        without = explain_all(admin, ['sub_users'], without_indexes=True)
+        self.assertEqual(list(without), ['sub_users'])
+        self.assertEqual(Bill.objects.filter(
+            user__admin=admin).exclude(code='').count(), 6)
+
+
+class RevenueStatisticsTest(SetUpTestCase):
+    def setUp(self):
+        super().setUp()
+        self.u_admin.user_permissions.set(
+            Permission.objects.filter(codename='view_bill'))
+        category = Category.objects.create(name='food', user=self.u_admin)
+        self.bread = Product.objects.create(
+            name='bread', price=1000, last_price=1000, discount=10, category=category)
+        self.milk = Product.objects.create(
+            name='milk', price=500, last_price=500, discount=0, category=category)
+        for seller, lines, debt in [(self.u_employee, [(self.bread, 2), (self.milk, 1)], 800),
+                                    (self.u_coworker, [(self.milk, 4)], 0)]:
+            bill = Bill.objects.create(
+                cash_payment=1000, debt=debt, code='test', user=self.u_end, creator=self.u_admin)
+            for product, number in lines:
+                BillProduct.objects.create(
+                    bill=bill, product=product, seller=seller, number=number)
+        old = Bill.objects.create(
+            cash_payment=0, used_credit=300, code='test', user=self.u_end, creator=self.u_admin)
+        Bill.objects.filter(pk=old.pk).update(
+            date_created=timezone.now()-timedelta(days=45))
+        super()._jwt_auth(self.u_admin)
+
+    def test_revenue_per_month(self):
+        r_revenue = self.client.get(
+            '/api/statInfo/revenueStatistics/per_month', format='json')
+        self.assertEqual(r_revenue.status_code, 200)
+        self.assertEqual(len(r_revenue.data), 12)
+        current = r_revenue.data[-1]
+        self.assertEqual(current['month'], timezone.localdate().replace(day=1))
+        self.assertEqual(current['revenue'], 4300)
+        self.assertEqual(current['discounts'], 200)
+        self.assertEqual(current['cumulative'], 4300)
+
+    def test_revenue_breakdowns_are_ranked(self):
+        r_sellers = self.client.get(
+            '/api/statInfo/revenueStatistics/per_seller', format='json')
+        self.assertEqual([(row['id'], row['revenue'], row['rank']) for row in r_sellers.data], [
+                         (self.u_employee.id, 2300, 1), (self.u_coworker.id, 2000, 2)])
+        self.assertAlmostEqual(sum(row['share'] for row in r_sellers.data), 100)
+        r_products = self.client.get(
+            '/api/statInfo/revenueStatistics/per_product', {'limit': 1}, format='json')
+        self.assertEqual([(row['name'], row['items'], row['revenue']) for row in r_products.data], [
+                         ('milk', 5, 2500)])
+        r_categories = self.client.get(
+            '/api/statInfo/revenueStatistics/per_category', format='json')
+        self.assertEqual([(row['name'], row['lines'], row['revenue']) for row in r_categories.data], [
+                         ('food', 3, 4300)])
+
+    def test_debt_aging(self):
+        r_aging = self.client.get(
+            '/api/statInfo/revenueStatistics/debt_aging', format='json')
+        self.assertEqual([(row['age'], row['bills'], row['debt'], row['used_credit']) for row in r_aging.data], [
+                         ('0-30', 1, 800, 0), ('31-60', 1, 0, 300), ('61-90', 0, 0, 0), ('91+', 0, 0, 0)])
+
+    def test_revenue_uses_single_query_and_cache(self):
+        url = '/api/statInfo/revenueStatistics/per_seller'
+        with self.assertNumQueries(1):
+            list(revenue_per(self.u_admin, 'seller'))
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'HIT')
+        bill = Bill.objects.filter(debt=800).get()
+        bill.debt = 0
+        bill.save()
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'MISS')
+
+    def test_revenue_needs_permission_and_known_name(self):
+        self.assertEqual(self.client.get(
+            '/api/statInfo/revenueStatistics/per_customer', format='json').status_code, 404)
+        self.assertEqual(self.client.get(
+            '/api/statInfo/revenueStatistics/per_month', {'limit': 'all'}, format='json').status_code, 400)
+        super()._jwt_auth(self.u_end)
+        self.assertEqual(self.client.get(
+            '/api/statInfo/revenueStatistics/per_month', format='json').status_code, 403)
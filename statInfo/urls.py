@@ -8,6 +8,7 @@ router = DefaultRouter()
 urlpatterns = [
     path('userStatistics/<str:name>', UserStatisticsView.as_view()),
     path('billStatistics/<str:name>', BillStatisticsView.as_view()),
+    path('revenueStatistics/<str:name>', RevenueStatisticsView.as_view()),
 ]
 
 urlpatterns += router.urls
@@ -7,57 +7,126 @@ from datetime import timedelta
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from users.authentication import StatelessJWTAuthentication
 from django.db.models.aggregates import Count
-from datetime import date
+from django.db.models import Sum
+from django.utils.dateparse import parse_datetime, parse_date
+from datetime import date, datetime
+from .rollups import aggregate_per_bucket, bucket_start, last_buckets, shift_bucket, BUCKETS
+from .models import DailyStatistic
+from crm.response_cache import cached_response
+from .revenue import (BREAKDOWNS, aging_rows, breakdown_rows, debt_aging, month_rows, revenue_per,
+                      revenue_per_month)
+
+DEFAULT_BREAKDOWN_ROWS = 50
+MAX_BREAKDOWN_ROWS = 1000
+MAX_BUCKETS = 366
+
+
+def get_bucket_range(query_params, year=0):
+    bucket = query_params.get('bucket', 'month')
+    if bucket not in BUCKETS:
+        raise ValueError('unknown bucket {}'.format(bucket))
+    if 'start' in query_params:
+        start = _parse_bound(query_params['start'])
+        end = _parse_bound(query_params['end']) if 'end' in query_params else timezone.now()
+        if end >= shift_bucket(bucket_start(start, bucket), bucket, MAX_BUCKETS):
+            raise ValueError('at most {} buckets'.format(MAX_BUCKETS))
+        return bucket, start, end
+    count = int(query_params.get('count', 12))
+    if not 1 <= count <= MAX_BUCKETS:
+        raise ValueError('count must be between 1 and {}'.format(MAX_BUCKETS))
+    until = timezone.now()
+    if year and year != until.year:
+        until = until.replace(year=year, day=min(until.day, 28))
+    start, end = last_buckets(count, bucket, until)
+    return bucket, start, end
+
+
+def _parse_bound(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed_date = parse_date(value)
+        if parsed_date is None:
+            raise ValueError('invalid date {}'.format(value))
+        parsed = datetime(parsed_date.year, parsed_date.month, parsed_date.day)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
 
 
 class UserStatisticsView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
-
-    def __get_users_per_months_count(self, admin, months=1, is_bill=False):
-        users = User.objects.filter(admin=admin)
-        if is_bill:
-            users = users.annotate(num_personal_bills=Count(
-                'personal_bills')).filter(num_personal_bills__gt=0)
-        for i in range(1, months+1):
-            lower_time = timezone.now()-timedelta(days=30*(i))
-            higher_time = timezone.now()-timedelta(days=30*(i-1))
-            yield users.filter(date_joined__gte=lower_time, date_joined__lte=higher_time).count()
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+
+    def __get_users_per_bucket_count(self, admin, bucket, start, end, is_bill=False):
+        counts = aggregate_per_bucket(DailyStatistic.objects.filter(admin=admin), 'day', start, end, bucket,
+                                      Sum('users_with_bills' if is_bill else 'users_joined'))
+        return [count for key, count in reversed(counts)]
 
     def get(self, request, name):
         if not(request.user.has_perm('users.view_user')):
             return Response(403)
+        try:
+            bucket, start, end = get_bucket_range(request.query_params)
+        except ValueError as e:
+            return Response({'errors': str(e)}, status=400)
         if name == 'per_month_created_user':
-            return Response([item for item in self.__get_users_per_months_count(request.user, 12)])
+            return cached_response(request, 'statistics', [request.user.id], lambda: Response(
+                self.__get_users_per_bucket_count(request.user, bucket, start, end)))
         elif name == 'per_month_users_has_bill':
-            return Response([item for item in self.__get_users_per_months_count(request.user, 12, True)])
+            return cached_response(request, 'statistics', [request.user.id], lambda: Response(
+                self.__get_users_per_bucket_count(request.user, bucket, start, end, True)))
         else:
             return Response(status=404)
 
 
 class BillStatisticsView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
-
-    def __get_bills_per_months_count(self, admin, year=0, months=1):
-        bills = Bill.objects.filter(user__admin=admin)
-        base_year = timezone.datetime.today().year if not(year) else year
-        year_dif = timezone.datetime.today().year - base_year
-        for i in range(1, months+1):
-            lower_time = timezone.now()-timedelta(days=30*(i)) - \
-                timedelta(days=365*year_dif)
-            higher_time = timezone.now()-timedelta(days=30*(i-1)) - \
-                timedelta(days=365*year_dif)
-            yield bills.filter(date_created__gte=lower_time, date_created__lte=higher_time).count()
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+
+    def __get_bills_per_bucket_count(self, admin, bucket, start, end):
+        counts = aggregate_per_bucket(DailyStatistic.objects.filter(
+            admin=admin), 'day', start, end, bucket, Sum('bills_created'))
+        return [count for key, count in reversed(counts)]
 
     def get(self, request, name):
         year = request.query_params['year'] if (
             'year' in request.query_params) else 0
         if not(request.user.has_perm('bills.view_bill')):
             return Response(403)
+        try:
+            bucket, start, end = get_bucket_range(
+                request.query_params, int(year))
+        except ValueError as e:
+            return Response({'errors': str(e)}, status=400)
         if name == 'per_month_created_bill':
-            return Response([item for item in self.__get_bills_per_months_count(request.user, int(year), 12)])
+            return cached_response(request, 'statistics', [request.user.id], lambda: Response(
+                self.__get_bills_per_bucket_count(request.user, bucket, start, end)))
+        else:
+            return Response(status=404)
+
+
+class RevenueStatisticsView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+
+    def get(self, request, name):
+        if not(request.user.has_perm('bills.view_bill')):
+            return Response(status=403)
+        try:
+            bucket, start, end = get_bucket_range(request.query_params)
+            limit = max(min(int(request.query_params.get('limit', DEFAULT_BREAKDOWN_ROWS)), MAX_BREAKDOWN_ROWS), 0)
+            as_of = _parse_bound(request.query_params['date']) if 'date' in request.query_params else timezone.now()
+        except ValueError as e:
+            return Response({'errors': str(e)}, status=400)
+        if name == 'per_month':
+            return cached_response(request, 'statistics', [request.user.id], lambda: Response(
+                month_rows(revenue_per_month(request.user, start, end), start, end)))
+        elif name.startswith('per_') and name[4:] in BREAKDOWNS:
+            return cached_response(request, 'statistics', [request.user.id], lambda: Response(
+                breakdown_rows(revenue_per(request.user, name[4:], start, end)[:limit], name[4:])))
+        elif name == 'debt_aging':
+            # the buckets move with the day, so a cached aging never outlives it
+            return cached_response(request, 'statistics', [request.user.id], lambda: Response(
+                aging_rows(debt_aging(request.user, as_of))), extra=[timezone.localdate()])
         else:
             return Response(status=404)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User, NotificationType, Notification, RequestLog, Country, Province, City
+from crm.admin import DateTimeDisplayAdmin
 
 
 class CountryAdmin(admin.ModelAdmin):
@@ -15,18 +16,21 @@ class CityAdmin(admin.ModelAdmin):
     list_display = ('name', 'province_id')
 
 
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(DateTimeDisplayAdmin):
     list_display = ('text', 'user', 'create_date_time',
                     'modify_date_time', 'is_news')
 
 
-class NotificationTypeAdmin(admin.ModelAdmin):
+class NotificationTypeAdmin(DateTimeDisplayAdmin):
     list_display = ('name', 'create_date_time',)
 
 
 class RequestLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'ip_address', 'user_agent',
-                    'referer', 'url', 'method')
+                    'referer', 'url', 'method', 'date_created')
+    list_select_related = ('user',)
+    ordering = ('-date_created',)
+    show_full_result_count = False
 
 
 class CustomUserAdmin(UserAdmin):
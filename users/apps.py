@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class UsersConfig(AppConfig):
@@ -6,4 +8,11 @@ class UsersConfig(AppConfig):
     name = 'users'
 
     def ready(self):
+        from crm.caches import is_shared
+        if settings.PERMISSION_CACHE['SHARED'] and not is_shared():
+            raise ImproperlyConfigured(
+                'PERMISSION_CACHE_SHARED needs a cache shared by all workers, set REDIS_URL')
+        if settings.JWT_STATELESS_AUTH and not is_shared():
+            raise ImproperlyConfigured(
+                'JWT_STATELESS_AUTH keeps claims freshness in the cache, set REDIS_URL')
         from . import signals
@@ -0,0 +1,131 @@
+import hashlib
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+CLAIMS = 'auth'
+CLAIMS_TIMEOUT = 60 * 60 * 24
+VERSION_KEY = 'users:auth:version'
+
+
+def auth_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def bump_auth_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def claims_key(user_id):
+    return 'users:auth:claims:{}:{}'.format(auth_version(), user_id)
+
+
+def perms_key(perms_hash):
+    return 'users:auth:perms:{}'.format(perms_hash)
+
+
+def digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def user_claims(user):
+    perms = sorted(user.get_all_permissions())
+    groups = sorted(user.groups.values_list('name', flat=True))
+    perms_hash = digest(perms)
+    claims = {
+        'admin_id': user.admin_id,
+        'groups': groups,
+        'perms': perms_hash,
+        'staff': user.is_staff,
+        'superuser': user.is_superuser,
+    }
+    claims['hash'] = digest(user.pk, user.is_active, sorted(claims.items()))
+    cache.set(perms_key(perms_hash), perms, CLAIMS_TIMEOUT)
+    cache.set(claims_key(user.pk), claims['hash'], CLAIMS_TIMEOUT)
+    return claims
+
+
+def invalidate_claims(user_id):
+    cache.delete(claims_key(user_id))
+
+
+def claims_are_fresh(user_id, claims):
+    return cache.get(claims_key(user_id)) == claims.get('hash')
+
+
+def stateless_user(user_id, claims, perms):
+    User = get_user_model()
+    loaded = {'id': user_id, 'admin_id': claims['admin_id'], 'is_active': True,
+              'is_staff': claims['staff'], 'is_superuser': claims['superuser']}
+    # from_db expects the values in the order of the model fields, the other fields stay deferred
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+    user = User.from_db(router.db_for_read(User), fields,
+                        [loaded[field] for field in fields])
+    # the permission checks read these caches before asking the database
+    user._perm_cache = set(perms)
+    user._group_names = frozenset(claims['groups'])
+    if claims['admin_id'] is None:
+        User.admin.field.set_cached_value(user, None)
+    else:
+        User.admin.field.set_cached_value(
+            user, User.from_db(router.db_for_read(User), ['id'], [claims['admin_id']]))
+    return user
+
+
+def has_group(user, name):
+    if hasattr(user, '_group_names'):
+        return name in user._group_names
+    return user.groups.filter(name=name).exists()
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[CLAIMS] = user_claims(user)
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        if CLAIMS in self.payload and not claims_are_fresh(user_id, self.payload[CLAIMS]):
+            # refreshing is the moment to replace claims which went stale
+            user = get_user_model().objects.filter(pk=user_id).first()
+            if user is not None:
+                access[CLAIMS] = user_claims(user)
+        return access
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not settings.JWT_STATELESS_AUTH or CLAIMS not in validated_token:
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        claims = validated_token[CLAIMS]
+        stored = cache.get(claims_key(user_id))
+        if stored == claims.get('hash'):
+            perms = cache.get(perms_key(claims['perms']))
+            if perms is not None:
+                return stateless_user(user_id, claims, perms)
+        user = super().get_user(validated_token)
+        if stored is None or stored == claims.get('hash'):
+            # nothing is cached for this user yet, so the next requests can skip the lookup
+            user_claims(user)
+        return user
@@ -0,0 +1,63 @@
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from .authentication import auth_version
+
+
+class PermissionCache:
+    def __init__(self):
+        self.local = {}
+        self.lock = threading.Lock()
+
+    def key(self, user_id):
+        return 'users:perms:{}:{}'.format(auth_version(), user_id)
+
+    def get(self, user_id):
+        entry = self.local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        perms = cache.get(self.key(user_id)) if settings.PERMISSION_CACHE['SHARED'] else None
+        if perms is not None:
+            self.remember(user_id, perms)
+        return perms
+
+    def set(self, user_id, perms):
+        perms = frozenset(perms)
+        if settings.PERMISSION_CACHE['SHARED']:
+            cache.set(self.key(user_id), perms,
+                      settings.PERMISSION_CACHE['TIMEOUT'])
+        self.remember(user_id, perms)
+
+    def remember(self, user_id, perms):
+        with self.lock:
+            if len(self.local) >= settings.PERMISSION_CACHE['LOCAL_SIZE']:
+                self.local.clear()
+            self.local[user_id] = (
+                time.monotonic()+settings.PERMISSION_CACHE['LOCAL_TIMEOUT'], perms)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.local.pop(user_id, None)
+        cache.delete(self.key(user_id))
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+
+
+permission_cache = PermissionCache()
+
+
+class CachedModelBackend(ModelBackend):
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            perms = permission_cache.get(user_obj.pk)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                permission_cache.set(user_obj.pk, perms)
+            user_obj._perm_cache = set(perms)
+        return user_obj._perm_cache
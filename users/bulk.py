@@ -0,0 +1,35 @@
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from .groups import group_id
+from .models import User
+from .notifications import BATCH_SIZE
+from .signals import users_bulk_created
+from .tasks import send_user_info_after_creation
+
+USER_FIELDS = ['username', 'first_name', 'last_name',
+               'email', 'mobile', 'national_code']
+
+
+def user_group(admin, group=None):
+    if admin.is_superuser:
+        return 'admin_user'
+    return group or 'end_user'
+
+
+def create_users(admin, users_data, group=None):
+    membership = group_id(user_group(admin, group))
+    # nobody learns a generated password, so skip the hashing and let users set one from the invite
+    users = [User(admin=admin, password=make_password(None), gender=data.get('Gender') or User.Gender.NOTHING,
+                  **{name: data[name] for name in USER_FIELDS if data.get(name) is not None}) for data in users_data]
+    Membership = User.groups.through
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        Membership.objects.bulk_create([Membership(user_id=user.id, group_id=membership) for user in users],
+                                       batch_size=BATCH_SIZE)
+        users_id = [user.id for user in users]
+        for i in range(0, len(users_id), BATCH_SIZE):
+            batch = users_id[i:i+BATCH_SIZE]
+            transaction.on_commit(
+                lambda batch=batch: send_user_info_after_creation.delay(batch))
+        users_bulk_created.send(sender=User, users=users)
+    return users
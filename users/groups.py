@@ -0,0 +1,31 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from .authentication import auth_version
+
+GROUP_TIMEOUT = 60 * 60 * 24
+
+
+def group_key(name, version):
+    # saving or deleting any group bumps the auth version, which retires these keys
+    return 'users:group:{}:{}'.format(version, name)
+
+
+def group_ids(names):
+    version = auth_version()
+    keys = {group_key(name, version): name for name in names}
+    names = set(keys.values())
+    ids = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = names - set(ids)
+    if missing:
+        found = dict(Group.objects.filter(
+            name__in=missing).values_list('name', 'id'))
+        cache.set_many({group_key(name, version): group_id for name, group_id in found.items()}, GROUP_TIMEOUT)
+        ids.update(found)
+    if names - set(ids):
+        raise Group.DoesNotExist('group {} does not exist'.format(
+            ', '.join(sorted(names - set(ids)))))
+    return ids
+
+
+def group_id(name):
+    return group_ids([name])[name]
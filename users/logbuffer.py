@@ -0,0 +1,109 @@
+import atexit
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import connection, router, transaction
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'FLUSH_SIZE': 200,
+    'FLUSH_INTERVAL': 5,
+}
+
+
+class RequestLogBuffer:
+    def __init__(self, max_size=None, flush_size=None, flush_interval=None):
+        options = {**DEFAULTS, **getattr(settings, 'REQUEST_LOG_BUFFER', {})}
+        self.max_size = max_size or options['MAX_SIZE']
+        self.flush_size = flush_size or options['FLUSH_SIZE']
+        self.flush_interval = flush_interval or options['FLUSH_INTERVAL']
+        self.entries = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.errors = 0
+
+    def add(self, entry):
+        with self.lock:
+            if len(self.entries) >= self.max_size:
+                self.dropped += 1
+                return False
+            self.entries.append(entry)
+            size = len(self.entries)
+        self.start()
+        if size >= self.flush_size:
+            self.wakeup.set()
+        return True
+
+    def flush(self):
+        from .models import RequestLog
+        with self.flush_lock:
+            with self.lock:
+                entries = list(self.entries)
+                self.entries.clear()
+            if not entries:
+                return 0
+            try:
+                RequestLog.objects.bulk_create(
+                    entries, batch_size=self.flush_size)
+                written = len(entries)
+            except Exception:
+                # one bad row, like a user deleted before the flush, should not cost the others
+                written = self.write_each(entries)
+            self.written += written
+            self.failed += len(entries) - written
+            return written
+
+    def write_each(self, entries):
+        from .models import RequestLog
+        written = 0
+        for entry in entries:
+            try:
+                with transaction.atomic(using=router.db_for_write(RequestLog)):
+                    RequestLog.objects.bulk_create([entry])
+            except Exception:
+                continue
+            written += 1
+        return written
+
+    def stats(self):
+        return {
+            'pending': len(self.entries),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='request-log-writer', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush_safely()
+
+    def flush_safely(self):
+        try:
+            return self.flush()
+        except Exception:
+            # the writer thread has to outlive any error, otherwise every later entry is dropped
+            self.errors += 1
+            return 0
+        finally:
+            connection.close()
+
+
+request_log_buffer = RequestLogBuffer()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from users.tenancy import backfill_tenants
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized tenant of bills, products, tickets, turns and user images'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = backfill_tenants()
+        for label, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(
+                'updated {} {} rows'.format(count, label)))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from users import partitions
+from users.models import RequestLog
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming request log partitions and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.REQUEST_LOG_PARTITIONS_AHEAD,
+                            help='number of future monthly partitions to keep ready')
+        parser.add_argument('--retention', type=int, default=settings.REQUEST_LOG_RETENTION_MONTHS,
+                            help='number of past months to keep, 0 keeps everything')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql' and partitions.is_partitioned(cursor):
+                created, dropped = partitions.rotate(
+                    cursor, today, options['ahead'], options['retention'])
+                for name in created:
+                    self.stdout.write('created partition {}'.format(name))
+                for name in dropped:
+                    self.stdout.write('dropped partition {}'.format(name))
+            elif options['retention']:
+                cutoff = partitions.month_bound(partitions.add_months(
+                    partitions.month_start(today), -options['retention']))
+                deleted, _ = RequestLog.objects.filter(
+                    date_created__lt=cutoff).delete()
+                self.stdout.write('deleted {} request logs'.format(deleted))
+        self.stdout.write(self.style.SUCCESS('request logs rotated'))
@@ -1,4 +1,10 @@
+from django.utils import timezone
 from .models import RequestLog
+from .logbuffer import request_log_buffer
+
+
+def truncate(value, length=255):
+    return value[:length] if value else value
 
 
 class RequestLogMiddleware:
@@ -9,18 +15,18 @@ class RequestLogMiddleware:
         if str(request.path).startswith(('/admin', '/favicon.ico')):
             response = self.get_response(request)
             return response
-        request_log = RequestLog.objects.create(
-            ip_address=request.META.get('REMOTE_ADDR'),
-            referer=request.META.get('HTTP_REFERER'),
-            user_agent=request.headers.get('User-Agent'),
-            url=request.path,
-            method=request.method)
-        request_log.save()
+        date_created = timezone.now()
 
         response = self.get_response(request)
 
-        if request.user.is_authenticated:
-            request_log.user = request.user
-            request_log.save()
+        user = getattr(request, 'user', None)
+        request_log_buffer.add(RequestLog(
+            user=user if user is not None and user.is_authenticated else None,
+            ip_address=request.META.get('REMOTE_ADDR'),
+            referer=truncate(request.META.get('HTTP_REFERER')),
+            user_agent=truncate(request.headers.get('User-Agent')),
+            url=truncate(request.path),
+            method=request.method,
+            date_created=date_created))
 
         return response
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_alter_requestlog_date_created'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['date_created'], name='users_reqlog_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['user', 'date_created'], name='users_reqlog_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['url', 'date_created'], name='users_reqlog_url_date_idx'),
+        ),
+    ]
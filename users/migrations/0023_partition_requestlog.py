@@ -0,0 +1,89 @@
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'users_requestlog'
+OLD_TABLE = TABLE + '_old'
+
+
+def add_months(month, months):
+    index = month.year*12 + month.month-1 + months
+    return date(index // 12, index % 12+1, 1)
+
+
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+    return cursor.fetchone() is not None
+
+
+def rebuild_table(cursor, partitioned, today, ahead=3):
+    cursor.execute('SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+                   [TABLE, TABLE + '_pkey'])
+    indexes = cursor.fetchall()
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = %s::regclass AND contype = 'f'", [TABLE])
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+    sequence = cursor.fetchone()[0]
+
+    # the rows are copied while the migration holds the table, trim old logs before running it on a big table
+    cursor.execute('ALTER TABLE {0} RENAME TO {1}'.format(TABLE, OLD_TABLE))
+    cursor.execute('CREATE TABLE {0} (LIKE {1} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){2}'.format(
+        TABLE, OLD_TABLE, ' PARTITION BY RANGE (date_created)' if partitioned else ''))
+    if sequence:
+        cursor.execute(
+            'ALTER SEQUENCE {0} OWNED BY {1}.id'.format(sequence, TABLE))
+    if partitioned:
+        cursor.execute('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(TABLE))
+        cursor.execute('SELECT min(date_created) FROM {0}'.format(OLD_TABLE))
+        first = cursor.fetchone()[0]
+        month = (first.date() if first else today).replace(day=1)
+        while month <= add_months(today.replace(day=1), ahead):
+            cursor.execute('CREATE TABLE {0}_y{1:04d}m{2:02d} PARTITION OF {0} FOR VALUES FROM (%s) TO (%s)'.format(
+                TABLE, month.year, month.month), [month_bound(month), month_bound(add_months(month, 1))])
+            month = add_months(month, 1)
+    cursor.execute(
+        'INSERT INTO {0} SELECT * FROM {1}'.format(TABLE, OLD_TABLE))
+    cursor.execute('DROP TABLE {0}'.format(OLD_TABLE))
+
+    # a primary key of a partitioned table has to contain the partition key, so id
+    # alone is no longer checked for uniqueness; ids only ever come from the sequence
+    cursor.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_pkey PRIMARY KEY ({1})'.format(
+        TABLE, 'id, date_created' if partitioned else 'id'))
+    for name, definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute('ALTER TABLE {0} ADD CONSTRAINT {1} {2}'.format(
+            TABLE, name, definition))
+
+
+def partition_request_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            rebuild_table(cursor, True, timezone.now().date())
+
+
+def unpartition_request_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            rebuild_table(cursor, False, timezone.now().date())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_requestlog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_request_log, unpartition_request_log),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_partition_requestlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turn',
+            name='date_reminded',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='turn',
+            index=models.Index(fields=['date_visit'], name='users_turn_visit_idx'),
+        ),
+    ]
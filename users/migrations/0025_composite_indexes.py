@@ -0,0 +1,33 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0024_turn_date_reminded'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'date_created'], name='users_notif_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', 'date_created'], name='users_ticket_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turn',
+            index=models.Index(fields=['user', 'date_created'], name='users_turn_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['admin', 'date_joined'], name='users_user_admin_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userimage',
+            index=models.Index(fields=['user', 'date_created'], name='users_image_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0025_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='tenant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='turn',
+            name='tenant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='userimage',
+            name='tenant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['tenant', 'date_created'], name='users_ticket_tenant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turn',
+            index=models.Index(fields=['tenant', 'date_created'], name='users_turn_tenant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userimage',
+            index=models.Index(fields=['tenant', 'date_created'], name='users_image_tenant_date_idx'),
+        ),
+    ]
@@ -1,9 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-import datetime
-import jdatetime
+from crm.dates import date_time
 from django.utils.translation import gettext as _
 from django.core.validators import MaxValueValidator
+from django.utils import timezone
 
 
 class Country(models.Model):
@@ -50,32 +50,52 @@ class User(AbstractUser):
 
     class Meta:
         ordering = ['date_joined']
+        indexes = [
+            models.Index(fields=['admin', 'date_joined'],
+                         name='users_user_admin_joined_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # kept to move the tenant of the user rows when the admin changes
+        if 'admin_id' in instance.__dict__:
+            instance._loaded_admin_id = instance.admin_id
+        return instance
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_joined, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_joined).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_joined)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
 
 class UserImage(models.Model):
     path = models.ImageField(upload_to='files/images')
     user = models.ForeignKey(User, models.CASCADE, related_name='images')
+    tenant = models.ForeignKey(
+        User, models.CASCADE, related_name='+', null=True, blank=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['user', 'date_created'],
+                         name='users_image_user_date_idx'),
+            models.Index(fields=['tenant', 'date_created'],
+                         name='users_image_tenant_date_idx'),
+        ]
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
 
 class Notification(models.Model):
@@ -88,14 +108,18 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['user', 'date_created'],
+                         name='users_notif_user_date_idx'),
+        ]
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
 
 class NotificationType(models.Model):
@@ -108,7 +132,7 @@ class NotificationType(models.Model):
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
 
 class Turn(models.Model):
@@ -117,25 +141,35 @@ class Turn(models.Model):
     product = models.ForeignKey(
         'bills.Product', models.CASCADE, related_name='turns', null=True, blank=True)
     user = models.ForeignKey(User, models.CASCADE, related_name='turns')
+    tenant = models.ForeignKey(
+        User, models.CASCADE, related_name='+', null=True, blank=True, editable=False)
     date_visit = models.DateTimeField()
+    date_reminded = models.DateTimeField(null=True, blank=True)
     description = models.TextField(max_length=2000, null=True, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['date_visit'], name='users_turn_visit_idx'),
+            models.Index(fields=['user', 'date_created'],
+                         name='users_turn_user_date_idx'),
+            models.Index(fields=['tenant', 'date_created'],
+                         name='users_turn_tenant_date_idx'),
+        ]
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
     @property
     def visit_date_time(self):
-        return datetime.datetime.strftime(self.date_visit, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_visit).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_visit)
 
 
 class Ticket(models.Model):
@@ -155,6 +189,8 @@ class Ticket(models.Model):
         choices=Type.choices, default=Type.SUGGESTION, max_length=30)
     subject = models.CharField(max_length=255)
     user = models.ForeignKey(User, models.CASCADE, related_name='tickets')
+    tenant = models.ForeignKey(
+        User, models.CASCADE, related_name='+', null=True, blank=True, editable=False)
     status = models.CharField(
         choices=State.choices, default=State.INIT, max_length=30)
     text = models.TextField(max_length=20000)
@@ -163,14 +199,20 @@ class Ticket(models.Model):
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['user', 'date_created'],
+                         name='users_ticket_user_date_idx'),
+            models.Index(fields=['tenant', 'date_created'],
+                         name='users_ticket_tenant_date_idx'),
+        ]
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
 
     @property
     def modify_date_time(self):
-        return datetime.datetime.strftime(self.date_modified, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_modified).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_modified)
 
 
 class RequestLog(models.Model):
@@ -181,11 +223,19 @@ class RequestLog(models.Model):
     user_agent = models.CharField(max_length=255, null=True)
     url = models.CharField(max_length=255, null=True)
     method = models.CharField(max_length=10)
-    date_created = models.DateTimeField(auto_now_add=True)
+    date_created = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['date_created'],
+                         name='users_reqlog_date_idx'),
+            models.Index(fields=['user', 'date_created'],
+                         name='users_reqlog_user_date_idx'),
+            models.Index(fields=['url', 'date_created'],
+                         name='users_reqlog_url_date_idx'),
+        ]
 
     @property
     def create_date_time(self):
-        return datetime.datetime.strftime(self.date_created, '%Y/%m/%d %H:%M'), _(jdatetime.datetime.fromgregorian(date=self.date_created).strftime('%Y/%m/%d %H:%M'))
+        return date_time(self.date_created)
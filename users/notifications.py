@@ -0,0 +1,34 @@
+import threading
+from collections import defaultdict
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+BATCH_SIZE = 500
+_batches = threading.local()
+
+
+class NotificationBatch:
+    def __init__(self):
+        self.events = defaultdict(set)
+
+    def add(self, task, pk):
+        self.events[task].add(pk)
+
+    def flush(self):
+        events, self.events = self.events, defaultdict(set)
+        for task, pks in events.items():
+            pks = sorted(pks)
+            for i in range(0, len(pks), BATCH_SIZE):
+                task.delay(pks[i:i+BATCH_SIZE])
+
+
+def notify_on_commit(task, pk, using=DEFAULT_DB_ALIAS):
+    connection = transaction.get_connection(using)
+    batch = getattr(_batches, using, None)
+    # a batch whose callback was dropped by a rollback or already ran can't be reused
+    if batch is None or not any(entry[1] == batch.flush for entry in connection.run_on_commit):
+        batch = NotificationBatch()
+        setattr(_batches, using, batch)
+        batch.add(task, pk)
+        transaction.on_commit(batch.flush, using=using)
+    else:
+        batch.add(task, pk)
@@ -0,0 +1,96 @@
+import re
+from datetime import date, datetime, timezone
+
+TABLE = 'users_requestlog'
+DEFAULT_PARTITION = TABLE + '_default'
+PARTITION_NAME = re.compile(r'^' + TABLE + r'_y(\d{4})m(\d{2})$')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year*12 + month.month-1 + months
+    return date(index // 12, index % 12+1, 1)
+
+
+def partition_name(month):
+    return '{0}_y{1:04d}m{2:02d}'.format(TABLE, month.year, month.month)
+
+
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+    return cursor.fetchone() is not None
+
+
+def partitions(cursor):
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass', [TABLE])
+    months = {}
+    for name, in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+def has_default_partition(cursor):
+    cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+    return cursor.fetchone()[0] is not None
+
+
+def create_partition(cursor, month):
+    name = partition_name(month)
+    lower, upper = month_bound(month), month_bound(add_months(month, 1))
+    moved = False
+    if has_default_partition(cursor):
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM {0} WHERE date_created >= %s AND date_created < %s)'.format(
+            DEFAULT_PARTITION), [lower, upper])
+        moved = cursor.fetchone()[0]
+    if not moved:
+        cursor.execute('CREATE TABLE IF NOT EXISTS {0} PARTITION OF {1} FOR VALUES FROM (%s) TO (%s)'.format(
+            name, TABLE), [lower, upper])
+        return name
+    # rows already landed in the default partition, move them before attaching
+    cursor.execute('CREATE TABLE {0} (LIKE {1} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(
+        name, TABLE))
+    cursor.execute('INSERT INTO {0} SELECT * FROM {1} WHERE date_created >= %s AND date_created < %s'.format(
+        name, DEFAULT_PARTITION), [lower, upper])
+    cursor.execute('DELETE FROM {0} WHERE date_created >= %s AND date_created < %s'.format(
+        DEFAULT_PARTITION), [lower, upper])
+    cursor.execute('ALTER TABLE {0} ATTACH PARTITION {1} FOR VALUES FROM (%s) TO (%s)'.format(
+        TABLE, name), [lower, upper])
+    return name
+
+
+def drop_partition(cursor, name):
+    cursor.execute('ALTER TABLE {0} DETACH PARTITION {1}'.format(TABLE, name))
+    cursor.execute('DROP TABLE {0}'.format(name))
+
+
+def rotate(cursor, today, ahead=3, retention=6):
+    current = month_start(today)
+    existing = partitions(cursor)
+    created, dropped = [], []
+    for i in range(ahead+1):
+        month = add_months(current, i)
+        if month not in existing:
+            created.append(create_partition(cursor, month))
+    if retention:
+        cutoff = add_months(current, -retention)
+        for month, name in sorted(existing.items()):
+            if month < cutoff:
+                drop_partition(cursor, name)
+                dropped.append(name)
+        if has_default_partition(cursor):
+            cursor.execute('DELETE FROM {0} WHERE date_created < %s'.format(
+                DEFAULT_PARTITION), [month_bound(cutoff)])
+    return created, dropped
+
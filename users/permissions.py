@@ -1,4 +1,5 @@
 from rest_framework.permissions import BasePermission
+from .authentication import has_group
 
 
 class SubUsersViewPermission(BasePermission):
@@ -11,7 +12,7 @@ class SubUserRetrievePermission(BasePermission):
         return request.user.has_perm('users.view_user')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user
+        return request.user.id == obj.user_id
 
 
 class SubUsersAddPermission(BasePermission):
@@ -24,7 +25,7 @@ class SubUsersChangePermission(BasePermission):
         return request.user.has_perm('users.change_user')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.admin or (request.user.admin == obj.admin)
+        return request.user.id == obj.admin_id or (request.user.admin_id == obj.admin_id)
 
 
 class SubUsersDeletePermission(BasePermission):
@@ -32,7 +33,7 @@ class SubUsersDeletePermission(BasePermission):
         return request.user.has_perm('users.delete_user')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.admin
+        return request.user.id == obj.admin_id
 
 
 class UserImageViewPermission(BasePermission):
@@ -45,7 +46,7 @@ class UserImageRetrievePermission(BasePermission):
         return request.user.has_perm('users.view_userimage')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user
+        return request.user.id == obj.user_id
 
 
 class UserImageAddPermission(BasePermission):
@@ -53,7 +54,7 @@ class UserImageAddPermission(BasePermission):
         return request.user.has_perm('users.add_userimage')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.admin or (request.user.admin == obj.admin)
+        return request.user.id == obj.admin_id or (request.user.admin_id == obj.admin_id)
 
 
 class UserImageChangePermission(BasePermission):
@@ -61,7 +62,7 @@ class UserImageChangePermission(BasePermission):
         return request.user.has_perm('users.change_userimage')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user.admin or (request.user.admin == obj.user.admin)
+        return request.user.id == obj.tenant_id or (request.user.admin_id == obj.tenant_id)
 
 
 class UserImageDeletePermission(BasePermission):
@@ -69,7 +70,7 @@ class UserImageDeletePermission(BasePermission):
         return request.user.has_perm('users.delete_userimage')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user.admin
+        return request.user.id == obj.tenant_id
 
 
 class TicketViewPermission(BasePermission):
@@ -82,7 +83,7 @@ class TicketRetrievePermission(BasePermission):
         return request.user.has_perm('users.view_ticket')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user
+        return request.user.id == obj.user_id
 
 
 class TicketAddPermission(BasePermission):
@@ -95,7 +96,7 @@ class TicketChangePermission(BasePermission):
         return request.user.has_perm('users.change_ticket')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user
+        return request.user.id == obj.user_id
 
 
 class TicketRemovePermission(BasePermission):
@@ -103,12 +104,12 @@ class TicketRemovePermission(BasePermission):
         return request.user.has_perm('users.delete_ticket')
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user
+        return request.user.id == obj.user_id
 
 
 class IsAdminPermission(BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="admin_user").exists()
+        return has_group(request.user, 'admin_user')
 
 
 class TurnViewPermission(BasePermission):
@@ -121,7 +122,7 @@ class TurnRetrievePermission(BasePermission):
         return request.user.has_perm('users.view_turn')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user.admin) or (request.user.admin == obj.user.admin)
+        return (request.user.id == obj.tenant_id) or (request.user.admin_id == obj.tenant_id)
 
 
 class TurnAddPermission(BasePermission):
@@ -134,7 +135,7 @@ class TurnChangePermission(BasePermission):
         return request.user.has_perm('users.change_turn')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user.admin) or (request.user.admin == obj.user.admin)
+        return (request.user.id == obj.tenant_id) or (request.user.admin_id == obj.tenant_id)
 
 
 class TurnRemovePermission(BasePermission):
@@ -142,4 +143,12 @@ class TurnRemovePermission(BasePermission):
         return request.user.has_perm('users.delete_turn')
 
     def has_object_permission(self, request, view, obj):
-        return (request.user == obj.user.admin) or (request.user.admin == obj.user.admin)
+        return (request.user.id == obj.tenant_id) or (request.user.admin_id == obj.tenant_id)
+
+
+class RequestLogViewPermission(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.has_perm('users.view_requestlog')
+
+    def has_object_permission(self, request, view, obj):
+        return obj.user_id is not None and request.user.id in [obj.user_id, obj.user.admin_id]
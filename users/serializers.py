@@ -1,8 +1,13 @@
 from rest_framework import serializers
 from .models import *
 import random
+from collections import Counter
 from django.contrib.auth.models import Group, Permission
 from django.db.models import Q
+from crm.fields import DateTimeDisplayField, DateTimeListSerializer
+from .groups import group_id
+
+MAX_BULK_USERS = 20000
 
 
 class UserImageSerializer(serializers.ModelSerializer):
@@ -12,12 +17,16 @@ class UserImageSerializer(serializers.ModelSerializer):
 
 
 class UserSerializer(serializers.ModelSerializer):
+    create_date_time = DateTimeDisplayField(source='date_joined')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
+
     class Meta:
         model = User
         images = UserImageSerializer(many=True)
         exclude = ['date_joined', 'last_login',
                    'birth_date', 'password']
         extra_kwargs = {'password': {'write_only': True}}
+        list_serializer_class = DateTimeListSerializer
 
 
 class UserFormSerializer(serializers.Serializer):
@@ -41,12 +50,12 @@ class UserFormSerializer(serializers.Serializer):
             list('abcdefghigklmnopqrstuvwxyz'), 10)))
         user.save()
         if user.admin.is_superuser:
-            user.groups.add(Group.objects.get(name='admin_user'))
+            user.groups.add(group_id('admin_user'))
         else:
             if group:
-                user.groups.add(Group.objects.get(name=group))
+                user.groups.add(group_id(group))
             else:
-                user.groups.add(Group.objects.get(name='end_user'))
+                user.groups.add(group_id('end_user'))
 
         return user
 
@@ -59,12 +68,32 @@ class UserFormSerializer(serializers.Serializer):
         return user
 
 
+class UserBulkSerializer(serializers.Serializer):
+    users = serializers.ListField(
+        child=UserFormSerializer(), allow_empty=False, max_length=MAX_BULK_USERS)
+
+    def validate_users(self, value):
+        errors = []
+        for field in ['username', 'email', 'mobile']:
+            values = Counter(data[field] for data in value if data.get(field))
+            duplicates = {item for item, count in values.items() if count > 1}
+            taken = set(User.objects.filter(**{field + '__in': list(values)}).values_list(field, flat=True))
+            for item in sorted(duplicates | taken):
+                errors.append('{} {} is already used'.format(field, item))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+
 class TicketSerializer(serializers.ModelSerializer):
     # user = UserSerializer()
+    create_date_time = DateTimeDisplayField(source='date_created')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
 
     class Meta:
         model = Ticket
         fields = '__all__'
+        list_serializer_class = DateTimeListSerializer
 
 
 class TicketFormSerializer(serializers.ModelSerializer):
@@ -109,19 +138,48 @@ class PermissionSetSerializer(serializers.Serializer):
 class TurnSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     coworker = UserSerializer(read_only=True)
+    create_date_time = DateTimeDisplayField(source='date_created')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
+    visit_date_time = DateTimeDisplayField(source='date_visit')
 
     class Meta:
         model = Turn
         fields = '__all__'
+        list_serializer_class = DateTimeListSerializer
 
 
 class TurnFormSerializer(serializers.ModelSerializer):
     class Meta:
         model = Turn
         fields = '__all__'
+        read_only_fields = ['date_reminded']
+
+    def update(self, instance, validated_data):
+        if 'date_visit' in validated_data and validated_data['date_visit'] != instance.date_visit:
+            instance.date_reminded = None
+        return super().update(instance, validated_data)
 
     def validate_user(self, value):
-        if (value.admin == self.context['request'].user) or (value.admin == self.context['request'].user.admin):
+        if (value.admin_id == self.context['request'].user.id) or (value.admin_id == self.context['request'].user.admin_id):
             return value
         else:
             raise serializers.ValidationError('user is not belongs to you')
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    create_date_time = DateTimeDisplayField(source='date_created')
+    modify_date_time = DateTimeDisplayField(source='date_modified')
+
+    class Meta:
+        model = Notification
+        fields = '__all__'
+        list_serializer_class = DateTimeListSerializer
+
+
+class RequestLogSerializer(serializers.ModelSerializer):
+    create_date_time = DateTimeDisplayField(source='date_created')
+
+    class Meta:
+        model = RequestLog
+        fields = '__all__'
+        list_serializer_class = DateTimeListSerializer
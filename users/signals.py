@@ -1,7 +1,16 @@
 from django.dispatch import Signal, receiver
-from django.db.models.signals import post_delete, post_save
-from .models import UserImage, User
+from django.db.models.signals import post_delete, post_save, pre_save, m2m_changed
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.utils import timezone
+from .models import UserImage, User, Ticket, Turn
+from .tenancy import user_tenant_id, needs_tenant, move_user_rows
 from .tasks import send_user_info_after_creation
+from .notifications import notify_on_commit
+from .authentication import invalidate_claims, bump_auth_version
+from .backends import permission_cache
+
+users_bulk_created = Signal()
 
 
 @receiver(post_delete, sender=UserImage)
@@ -12,4 +21,75 @@ def user_image_delete(sender, **kwargs):
 
 @receiver(post_save, sender=User)
 def user_created(sender, **kwargs):
-    send_user_info_after_creation(kwargs['instance'])
+    if kwargs['created'] and not kwargs.get('raw'):
+        notify_on_commit(send_user_info_after_creation, kwargs['instance'].pk)
+
+
+@receiver(post_save, sender=User)
+def user_admin_changed(sender, **kwargs):
+    instance = kwargs['instance']
+    if not kwargs['created'] and needs_tenant(kwargs, 'admin', 'admin_id') and (
+            not hasattr(instance, '_loaded_admin_id') or instance._loaded_admin_id != instance.admin_id):
+        move_user_rows(instance)
+    instance._loaded_admin_id = instance.admin_id
+
+
+@receiver(pre_save, sender=Ticket)
+@receiver(pre_save, sender=Turn)
+@receiver(pre_save, sender=UserImage)
+def set_user_tenant(sender, **kwargs):
+    if needs_tenant(kwargs, 'user', 'user_id'):
+        kwargs['instance'].tenant_id = user_tenant_id(kwargs['instance'])
+
+
+def invalidate_user_access(user_id):
+    invalidate_claims(user_id)
+    permission_cache.invalidate(user_id)
+
+
+def invalidate_all_access():
+    bump_auth_version()
+    permission_cache.clear_local()
+
+
+def refresh_user_access(user_id):
+    # invalidate again after commit so permissions read before it are not cached on
+    invalidate_user_access(user_id)
+    transaction.on_commit(lambda: invalidate_user_access(user_id))
+
+
+def refresh_all_access():
+    invalidate_all_access()
+    transaction.on_commit(invalidate_all_access)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_claims_changed(sender, **kwargs):
+    if not kwargs.get('raw'):
+        refresh_user_access(kwargs['instance'].pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_access_changed(sender, **kwargs):
+    if not kwargs['action'].startswith('post_'):
+        return
+    if kwargs['reverse']:
+        # a group or permission changed for many users at once
+        refresh_all_access()
+        touched = kwargs['pk_set']
+    else:
+        refresh_user_access(kwargs['instance'].pk)
+        touched = [kwargs['instance'].pk]
+    if touched:
+        # the serialized user lists its groups and permissions, keep the list validators honest
+        User.objects.filter(pk__in=touched).update(date_modified=timezone.now())
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_access_changed(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_') and not kwargs.get('raw'):
+        refresh_all_access()
@@ -1,26 +1,47 @@
 from celery import shared_task
-from .models import Turn, Notification
+from .models import Turn, Notification, User
 from django.utils import timezone
 from datetime import timedelta
+from django.core.management import call_command
+from django.db import transaction
+
+TURN_REMINDER_WINDOW = timedelta(hours=3)
+TURN_REMINDER_BATCH_SIZE = 500
 
 
 @shared_task(name='send_turn_message')
 def send_turn_message():
-    time_threshold = timezone.now()+timedelta(hours=3)
-    turns = Turn.objects.filter(date_visit__lte=time_threshold)
-    notifications = []
-    for item in turns:
-        notifications.append(Notification(
-            text='you have an appointment at {}'.format(item.visit_date_time),
-            user=item.user,
-        ))
-        # send messages
-
-    Notification.objects.bulk_create(notifications)
+    now = timezone.now()
+    # only upcoming turns which are not reminded yet, the date_visit index bounds the scan
+    turns = Turn.objects.filter(date_visit__gt=now, date_visit__lte=now+TURN_REMINDER_WINDOW,
+                                date_reminded__isnull=True).only('id', 'user_id', 'date_visit').order_by('date_visit')
+    sent = 0
+    while True:
+        with transaction.atomic():
+            batch = list(turns.select_for_update(
+                skip_locked=True)[:TURN_REMINDER_BATCH_SIZE])
+            if not batch:
+                break
+            Notification.objects.bulk_create([Notification(
+                text='you have an appointment at {}'.format(
+                    item.visit_date_time),
+                user_id=item.user_id,
+            ) for item in batch])
+            # send messages
+            Turn.objects.filter(id__in=[item.id for item in batch]).update(
+                date_reminded=now)
+        sent += len(batch)
+    return sent
 
 
 @shared_task
-def send_user_info_after_creation(user):
-    Notification.objects.create(
-        user=user, text="wellcome to our crm, your username is {0}.".format(user.username))
+def send_user_info_after_creation(users_id):
+    Notification.objects.bulk_create([
+        Notification(user_id=user_id, text="wellcome to our crm, your username is {0}.".format(username))
+        for user_id, username in User.objects.filter(id__in=users_id).values_list('id', 'username')])
     # send message
+
+
+@shared_task(name='rotate_request_logs')
+def rotate_request_logs():
+    call_command('rotate_request_logs')
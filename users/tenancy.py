@@ -0,0 +1,72 @@
+from collections import defaultdict
+from django.apps import apps
+from django.db.models import OuterRef, Subquery
+from bills.categories import ancestors, descendants
+
+# rows of these models belong to the admin of their user
+USER_TENANT_MODELS = ['bills.Bill', 'users.Ticket',
+                      'users.Turn', 'users.UserImage']
+
+
+def user_tenant_id(instance):
+    field = type(instance)._meta.get_field('user')
+    if field.is_cached(instance):
+        user = field.get_cached_value(instance)
+        if user is not None and user.pk == instance.user_id:
+            return user.admin_id
+    return field.related_model._default_manager.filter(
+        pk=instance.user_id).values_list('admin_id', flat=True).first()
+
+
+def category_tenant_id(category):
+    # a category without an owner belongs to the owner of its closest owned ancestor
+    if category.user_id is not None:
+        return category.user_id
+    return ancestors(category).exclude(user=None).values_list('user_id', flat=True).last()
+
+
+def product_tenant_id(product):
+    field = type(product)._meta.get_field('category')
+    category = field.get_cached_value(product) if field.is_cached(product) else None
+    if category is None or category.pk != product.category_id:
+        category = field.related_model._default_manager.filter(
+            pk=product.category_id).only('user', 'path').first()
+    return category_tenant_id(category) if category is not None else None
+
+
+def needs_tenant(kwargs, *fields):
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('raw'):
+        return False
+    return update_fields is None or any(field in update_fields for field in fields)
+
+
+def move_user_rows(user):
+    for label in USER_TENANT_MODELS:
+        apps.get_model(label)._default_manager.filter(user_id=user.pk).exclude(
+            tenant_id=user.admin_id).update(tenant_id=user.admin_id)
+
+
+def move_category_products(category):
+    owners = {category.pk: category_tenant_id(category)}
+    for pk, parent_id, user_id in descendants(category).order_by('depth').values_list('pk', 'parent', 'user'):
+        owners[pk] = user_id if user_id is not None else owners[parent_id]
+    categories = defaultdict(list)
+    for pk, tenant_id in owners.items():
+        categories[tenant_id].append(pk)
+    for tenant_id, category_ids in categories.items():
+        category.products.model._default_manager.filter(category__in=category_ids).exclude(
+            tenant_id=tenant_id).update(tenant_id=tenant_id)
+
+
+def backfill_tenants(get_model=apps.get_model):
+    User = get_model('users', 'User')
+    Category = get_model('bills', 'Category')
+    counts = {}
+    for label in USER_TENANT_MODELS:
+        model = get_model(*label.split('.'))
+        counts[label] = model._default_manager.update(tenant_id=Subquery(
+            User._default_manager.filter(pk=OuterRef('user_id')).values('admin_id')[:1]))
+    counts['bills.Product'] = get_model('bills', 'Product')._default_manager.update(tenant_id=Subquery(
+        Category._default_manager.filter(pk=OuterRef('category_id')).values('user_id')[:1]))
+    return counts
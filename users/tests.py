@@ -1,9 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APITestCase
-from .models import User, UserImage, Ticket, Turn
+from unittest import mock
+from .models import User, UserImage, Ticket, Turn, RequestLog, Notification
+from .tasks import send_user_info_after_creation, send_turn_message
+from .logbuffer import RequestLogBuffer
 from django.contrib.auth.models import Group, Permission
 from rest_framework_simplejwt.tokens import RefreshToken
 import datetime
+import io
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from . import partitions
+from .backends import permission_cache
+from django.test import override_settings
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test.utils import CaptureQueriesContext
+from statInfo.models import DailyStatistic
 
 
 class UrlTest(APITestCase):
@@ -417,3 +432,335 @@ class UrlTest(APITestCase):
         self.assertEqual(r_coworkers_read.status_code, 200)
 
     # def test_
+
+
+class RequestLogBufferTest(APITestCase):
+    def test_buffer_writes_entries_in_bulk(self):
+        log_buffer = RequestLogBuffer(max_size=10, flush_size=5)
+        for i in range(3):
+            log_buffer.add(RequestLog(ip_address='127.0.0.1',
+                                      url='/api/users/users/', method='GET'))
+        self.assertEqual(RequestLog.objects.count(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(log_buffer.flush(), 3)
+        self.assertEqual(RequestLog.objects.count(), 3)
+        self.assertEqual(log_buffer.stats()['written'], 3)
+
+    def test_writer_survives_flush_errors(self):
+        log_buffer = RequestLogBuffer(max_size=10, flush_size=5)
+        with mock.patch.object(log_buffer, 'flush', side_effect=RuntimeError), \
+                mock.patch('users.logbuffer.connection'):
+            self.assertEqual(log_buffer.flush_safely(), 0)
+        self.assertEqual(log_buffer.stats()['errors'], 1)
+
+    def test_buffer_drops_entries_when_full(self):
+        log_buffer = RequestLogBuffer(max_size=2, flush_size=5)
+        for i in range(4):
+            log_buffer.add(RequestLog(ip_address='127.0.0.1',
+                                      url='/api/users/users/', method='GET'))
+        self.assertEqual(log_buffer.stats()['pending'], 2)
+        self.assertEqual(log_buffer.stats()['dropped'], 2)
+
+
+class RequestLogBufferFailureTest(TransactionTestCase):
+    def test_bad_entries_do_not_lose_the_batch(self):
+        log_buffer = RequestLogBuffer(max_size=10, flush_size=5)
+        for url, user_id in [('/api/users/users/', None), ('/' * 300, None), ('/api/bills/bills/', 0), ('/api/bills/', None)]:
+            log_buffer.add(RequestLog(ip_address='10.0.0.9', url=url, method='GET', user_id=user_id))
+        self.assertEqual(log_buffer.flush(), 2)
+        # the shared writer thread may flush other tests' requests meanwhile
+        self.assertEqual(RequestLog.objects.filter(ip_address='10.0.0.9').count(), 2)
+        self.assertEqual(log_buffer.stats()['failed'], 2)
+
+
+class RequestLogPartitionTest(APITestCase):
+    def test_rotate_creates_future_and_drops_expired_partitions(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('request log partitions need postgresql')
+        old = timezone.now() - datetime.timedelta(days=31*8)
+        with connection.cursor() as cursor:
+            partitions.create_partition(cursor, partitions.month_start(old))
+        RequestLog.objects.create(
+            ip_address='127.0.0.1', url='/api/users/users/', method='GET', date_created=old)
+        connection.check_constraints()
+        call_command('rotate_request_logs', ahead=2,
+                     retention=6, stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            months = partitions.partitions(cursor)
+        current = partitions.month_start(timezone.now())
+        for i in range(3):
+            self.assertIn(partitions.add_months(current, i), months)
+        self.assertNotIn(partitions.month_start(old), months)
+        self.assertEqual(RequestLog.objects.count(), 0)
+
+
+class NotificationDispatchTest(APITestCase):
+    def test_user_creation_is_notified_once_after_commit(self):
+        with mock.patch.object(send_user_info_after_creation, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                user = User.objects.create(
+                    username='u_new', password='mmmmm46456456456')
+                user.first_name = 'new'
+                user.save()
+                other_user = User.objects.create(
+                    username='u_other', password='mmmmm46456456456')
+                self.assertFalse(delay.called)
+        delay.assert_called_once_with([user.id, other_user.id])
+
+    def test_notifications_are_inserted_in_batch(self):
+        users = [User.objects.create(username='u_'+str(i), password='mmmmm46456456456')
+                 for i in range(3)]
+        with self.assertNumQueries(2):
+            send_user_info_after_creation([user.id for user in users])
+        self.assertEqual(Notification.objects.filter(
+            user__in=users).count(), 3)
+
+
+class TurnReminderTest(APITestCase):
+    def test_turns_are_reminded_once(self):
+        user = User.objects.create(
+            username='u_end', password='mmmmm46456456456')
+        now = timezone.now()
+        Turn.objects.create(user=user, date_visit=now -
+                            datetime.timedelta(hours=1))
+        upcoming = Turn.objects.create(
+            user=user, date_visit=now+datetime.timedelta(hours=1))
+        Turn.objects.create(user=user, date_visit=now +
+                            datetime.timedelta(hours=5))
+        self.assertEqual(send_turn_message(), 1)
+        self.assertEqual(Notification.objects.filter(
+            user=user, text__startswith='you have an appointment').count(), 1)
+        upcoming.refresh_from_db()
+        self.assertIsNotNone(upcoming.date_reminded)
+        self.assertEqual(send_turn_message(), 0)
+
+
+@override_settings(JWT_STATELESS_AUTH=True)
+class StatelessAuthTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_bill', 'view_user']))
+        self.u_admin = User.objects.create_user(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        r_token = self.client.post(
+            '/api/token/', data={'username': 'u_admin', 'password': 'Mrb76420'}, format='json')
+        self.assertEqual(r_token.status_code, 200)
+        self.refresh = r_token.data['refresh']
+        self.authorize(r_token.data['access'])
+
+    def authorize(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        return response, [query['sql'] for query in queries
+                          if 'FROM "users_user"' in query['sql'] or 'FROM "auth_permission"' in query['sql']]
+
+    def test_authenticates_without_user_lookup(self):
+        response, queries = self.user_queries('/api/bills/bills/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        response, queries = self.user_queries('/api/users/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stateless_auth_needs_shared_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            apps.get_app_config('users').ready()
+
+    def test_stale_claims_fall_back_to_lookup(self):
+        self.u_admin.groups.clear()
+        response, queries = self.user_queries('/api/bills/bills/')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotEqual(queries, [])
+        r_token = self.client.post(
+            '/api/token/refresh/', data={'refresh': self.refresh}, format='json')
+        self.authorize(r_token.data['access'])
+        response, queries = self.user_queries('/api/bills/bills/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(queries, [])
+
+
+class PermissionCacheTest(APITestCase):
+    def setUp(self):
+        self.g_admin = Group.objects.create(name='admin_user')
+        self.g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_user', 'change_user']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(self.g_admin)
+        self.u_sub = User.objects.create(
+            username='u_sub', password='Mrb76420', admin=self.u_admin)
+
+    @override_settings(PERMISSION_CACHE={**settings.PERMISSION_CACHE, 'SHARED': True})
+    def test_permissions_are_shared_between_requests(self):
+        self.assertTrue(User.objects.get(
+            pk=self.u_admin.pk).has_perm('users.view_user'))
+        user = User.objects.get(pk=self.u_admin.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('users.view_user'))
+        permission_cache.clear_local()
+        user = User.objects.get(pk=self.u_admin.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('users.change_user'))
+
+    def test_without_shared_cache_only_local_copy_is_kept(self):
+        self.assertFalse(settings.PERMISSION_CACHE['SHARED'])
+        self.assertTrue(User.objects.get(
+            pk=self.u_admin.pk).has_perm('users.view_user'))
+        permission_cache.clear_local()
+        user = User.objects.get(pk=self.u_admin.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(user.has_perm('users.view_user'))
+        self.assertTrue(queries)
+
+    def test_shared_permission_cache_needs_shared_backend(self):
+        with override_settings(PERMISSION_CACHE={**settings.PERMISSION_CACHE, 'SHARED': True}):
+            with self.assertRaises(ImproperlyConfigured):
+                apps.get_app_config('users').ready()
+
+    def test_permissions_cached_before_commit_are_invalidated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.u_sub.user_permissions.add(
+                Permission.objects.get(codename='view_turn'))
+            # a concurrent request caching the permissions before the commit
+            permission_cache.set(self.u_sub.pk, set())
+        self.assertTrue(User.objects.get(
+            pk=self.u_sub.pk).has_perm('users.view_turn'))
+
+    def test_permission_change_invalidates_cache(self):
+        self.assertFalse(User.objects.get(
+            pk=self.u_sub.pk).has_perm('users.view_turn'))
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+        permission = Permission.objects.get(codename='view_turn')
+        r_permission_change = self.client.patch(
+            '/api/users/ChangeUserPermissionList/'+str(self.u_sub.id), data={'permission_id': [permission.id]}, format='json')
+        self.assertEqual(r_permission_change.status_code, 204)
+        self.assertTrue(User.objects.get(
+            pk=self.u_sub.pk).has_perm('users.view_turn'))
+
+    def test_group_changes_invalidate_cache(self):
+        self.assertFalse(User.objects.get(
+            pk=self.u_sub.pk).has_perm('users.view_user'))
+        self.u_sub.groups.add(self.g_admin)
+        self.assertTrue(User.objects.get(
+            pk=self.u_sub.pk).has_perm('users.view_user'))
+        self.g_admin.permissions.remove(
+            Permission.objects.get(codename='view_user'))
+        self.assertFalse(User.objects.get(
+            pk=self.u_admin.pk).has_perm('users.view_user'))
+
+    def test_permission_change_refreshes_user_list_etag(self):
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+        etag = self.client.get('/api/users/users/', format='json')['ETag']
+        self.assertEqual(self.client.get(
+            '/api/users/users/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.u_sub.user_permissions.add(
+            Permission.objects.get(codename='view_turn'))
+        self.assertEqual(self.client.get(
+            '/api/users/users/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class NotificationListTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'view_requestlog']))
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        self.u_sub = User.objects.create(
+            username='u_sub', password='Mrb76420', admin=self.u_admin)
+        self.u_other = User.objects.create(
+            username='u_other', password='Mrb76420')
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def test_notifications_are_paged_by_cursor(self):
+        Notification.objects.bulk_create(
+            [Notification(user=self.u_admin, text=str(i)) for i in range(3)])
+        Notification.objects.create(user=self.u_sub, text='sub')
+        r_notifications = self.client.get(
+            '/api/users/notifications/?pagination=cursor&page_size=2', format='json')
+        self.assertEqual([notification['text'] for notification in r_notifications.data['results']],
+                         ['0', '1'])
+        r_notifications = self.client.get(
+            r_notifications.data['next'], format='json')
+        self.assertEqual([notification['text'] for notification in r_notifications.data['results']],
+                         ['2'])
+        self.assertIsNone(r_notifications.data['next'])
+
+    def test_request_logs_are_scoped_to_sub_users(self):
+        RequestLog.objects.create(ip_address='127.0.0.1', method='GET', user=self.u_sub)
+        RequestLog.objects.create(ip_address='127.0.0.1', method='GET', user=self.u_other)
+        RequestLog.objects.create(ip_address='127.0.0.1', method='GET')
+        r_logs = self.client.get(
+            '/api/users/requestLogs/?pagination=cursor&count=exact', format='json')
+        self.assertEqual(r_logs.status_code, 200)
+        self.assertEqual(r_logs.data['count'], 1)
+        self.assertEqual(r_logs.data['results'][0]['user'], self.u_sub.id)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(
+            RefreshToken().for_user(self.u_sub).access_token))
+        self.assertEqual(self.client.get(
+            '/api/users/requestLogs/', format='json').status_code, 403)
+
+
+class BulkUserTest(APITestCase):
+    def setUp(self):
+        g_admin = Group.objects.create(name='admin_user')
+        g_admin.permissions.set(Permission.objects.filter(codename__in=[
+            'add_user']))
+        Group.objects.create(name='end_user')
+        Group.objects.create(name='employee_user')
+        self.u_admin = User.objects.create(
+            username='u_admin', password='Mrb76420')
+        self.u_admin.groups.add(g_admin)
+        refresh_token = RefreshToken().for_user(self.u_admin)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + str(refresh_token.access_token))
+
+    def _users(self, count, prefix='user_', first_mobile=0):
+        return {'users': [{'username': prefix+str(i), 'mobile': '09{:08d}'.format(first_mobile+i)} for i in range(count)]}
+
+    def test_bulk_creates_users_with_groups(self):
+        with mock.patch.object(send_user_info_after_creation, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                r_users = self.client.post(
+                    '/api/users/users/bulk/', self._users(3), format='json')
+        self.assertEqual(r_users.status_code, 201)
+        users = User.objects.filter(admin=self.u_admin)
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(users.filter(groups__name='end_user').count(), 3)
+        self.assertFalse(users[0].has_usable_password())
+        delay.assert_called_once_with(
+            [user['id'] for user in r_users.data['created_users']])
+        self.assertEqual(DailyStatistic.objects.get(
+            admin=self.u_admin, day=timezone.localdate()).users_joined, 3)
+
+    def test_bulk_query_count_does_not_grow_with_users(self):
+        self.client.post('/api/users/employees/bulk/', self._users(1, 'warm_', 9), format='json')
+        with CaptureQueriesContext(connection) as few:
+            self.client.post('/api/users/employees/bulk/', self._users(2, 'few_', 5), format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post('/api/users/employees/bulk/', self._users(30, 'many_', 10), format='json')
+        self.assertEqual(User.objects.filter(
+            groups__name='employee_user', username__startswith='many_').count(), 30)
+        self.assertEqual(len(many), len(few))
+
+    def test_bulk_rejects_taken_usernames(self):
+        data = self._users(2)
+        data['users'].append({'username': 'u_admin'})
+        data['users'].append({'username': 'user_0'})
+        r_users = self.client.post(
+            '/api/users/users/bulk/', data, format='json')
+        self.assertEqual(r_users.status_code, 400)
+        self.assertEqual(r_users.data['errors']['users'], [
+            'username u_admin is already used', 'username user_0 is already used'])
+        self.assertFalse(User.objects.filter(admin=self.u_admin).exists())
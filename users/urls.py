@@ -11,6 +11,8 @@ router.register(r'tickets', TicketViewSet, basename='ticket')
 router.register(r'adminTickets', AdminTicketViewSet, basename='adminTicket')
 router.register(r'turns', TurnViewSet, basename='turn')
 router.register(r'readTurns', TurnReadViewSet, basename='readTurn')
+router.register(r'notifications', NotificationViewSet, basename='notification')
+router.register(r'requestLogs', RequestLogViewSet, basename='requestLog')
 
 urlpatterns = [
     path('EditProfile', EditProfile.as_view()),
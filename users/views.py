@@ -5,17 +5,31 @@ from rest_framework import viewsets
 from .serializers import *
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, BasePermission
 from rest_framework.authentication import TokenAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import StatelessJWTAuthentication
 from .permissions import *
 from rest_framework.parsers import MultiPartParser
-from .models import UserImage, Ticket
+from .models import UserImage, Ticket, Notification, RequestLog
 from django.db.models import Q
 from .filters import *
+from crm.conditional import ConditionalListMixin
+from crm.pagination import SelectablePaginationMixin
+from rest_framework.decorators import action
+from .bulk import create_users
+from .groups import group_id
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def bulk_create_response(request, group=None):
+    bulk_serializer = UserBulkSerializer(data=request.data)
+    if not bulk_serializer.is_valid():
+        return Response({'response': False, 'errors': bulk_serializer.errors}, status=400)
+    users = create_users(
+        request.user, bulk_serializer.validated_data['users'], group=group)
+    return Response({'response': True, 'created_users': [{'id': user.id, 'username': user.username} for user in users]}, status=201)
+
+
+class UserViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
     filterset_class = UserFilter
 
     def get_queryset(self):
@@ -27,7 +41,7 @@ class UserViewSet(viewsets.ModelViewSet):
         elif self.action == 'retrieve':
             permission_classes = [IsAuthenticated, SubUserRetrievePermission]
 
-        elif self.action == 'create':
+        elif self.action in ['create', 'bulk']:
             permission_classes = [IsAuthenticated, SubUsersAddPermission]
         elif self.action in ['update', 'partial_update']:
             permission_classes = [IsAuthenticated, SubUsersChangePermission]
@@ -50,6 +64,10 @@ class UserViewSet(viewsets.ModelViewSet):
         else:
             return Response({'response': False, 'errors': user_serializer.errors})
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        return bulk_create_response(request)
+
     def partial_update(self, request, pk=None):
         update_instance = User.objects.get(pk=pk)
         self.check_object_permissions(request, update_instance)
@@ -64,7 +82,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
 class EmployeeViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
 
     def get_permissions(self):
         if self.action == 'list':
@@ -72,7 +90,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         elif self.action == 'retrieve':
             permission_classes = [IsAuthenticated, SubUserRetrievePermission]
 
-        elif self.action == 'create':
+        elif self.action in ['create', 'bulk']:
             permission_classes = [IsAuthenticated, SubUsersAddPermission]
         elif self.action in ['update', 'partial_update']:
             permission_classes = [IsAuthenticated, SubUsersChangePermission]
@@ -86,6 +104,10 @@ class EmployeeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return self.request.user.subUsers.filter(group_name='employee_user')
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        return bulk_create_response(request, group='employee_user')
+
     def create(self, request):
         user_serializer = UserFormSerializer(
             data=request.data, context={'request': request})
@@ -111,7 +133,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
 
 
 class CoworkerViewSet(viewsets.ModelViewSet):
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
     serializer_class = UserSerializer
 
     def get_queryset(self):
@@ -135,7 +157,7 @@ class CoworkerViewSet(viewsets.ModelViewSet):
             data=request.data, context={'request': request})
         if user_serializer.is_valid():
             coworker = user_serializer.create(request.data)
-            coworker.groups.set([Group.objects.get(name='coworker_user')])
+            coworker.groups.set([group_id('coworker_user')])
             return Response(self.serializer_class(coworker).data, 201)
         else:
             return Response(user_serializer.errors, 400)
@@ -146,7 +168,7 @@ class CoworkerViewSet(viewsets.ModelViewSet):
 
 class EditProfile(UpdateAPIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
 
     def get_queryset(self):
         return self.request.user
@@ -168,10 +190,10 @@ class EditProfile(UpdateAPIView):
 class SubUserImageViewSet(viewsets.ModelViewSet):
     serializer_class = UserImageSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
 
     def get_queryset(self):
-        return UserImage.objects.filter(user__admin=self.request.user)
+        return UserImage.objects.filter(tenant=self.request.user)
 
     def get_permissions(self):
         if self.action == 'list':
@@ -222,7 +244,7 @@ class SubUserImageViewSet(viewsets.ModelViewSet):
 
 class TicketViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
     serializer_class = TicketSerializer
 
     def get_queryset(self):
@@ -257,10 +279,10 @@ class TicketViewSet(viewsets.ModelViewSet):
 
 class AdminTicketViewSet(viewsets.ModelViewSet):
     serializer_class = TicketSerializer
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
 
     def get_queryset(self):
-        return Ticket.objects.filter(Q(user__admin=self.request.user) | Q(user__admin=self.request.user.admin))
+        return Ticket.objects.filter(Q(tenant=self.request.user) | Q(tenant=self.request.user.admin))
 
     def get_permissions(self):
         if self.action == 'list':
@@ -281,7 +303,7 @@ class AdminTicketViewSet(viewsets.ModelViewSet):
 
 class UserPermissions(ListAPIView):
     permission_classes = [IsAuthenticated, IsAdminPermission]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
     serializer_class = PermissionSerializer
 
     def get_queryset(self, pk):
@@ -295,7 +317,7 @@ class UserPermissions(ListAPIView):
 
 class ChangeUserPermissions(UpdateAPIView):
     permission_classes = [IsAuthenticated, IsAdminPermission]
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
 
     def get_queryset(self, pk):
         return self.request.user.subUsers.get(pk=pk)
@@ -312,11 +334,11 @@ class ChangeUserPermissions(UpdateAPIView):
 
 
 class TurnReadViewSet(viewsets.ReadOnlyModelViewSet):
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
     serializer_class = TurnSerializer
 
     def get_queryset(self):
-        return Turn.objects.filter(Q(user__admin=self.request.user) | Q(user__admin=self.request.user.admin))
+        return Turn.objects.filter(Q(tenant=self.request.user) | Q(tenant=self.request.user.admin))
 
     def get_permissions(self):
         if self.action == 'list':
@@ -330,11 +352,11 @@ class TurnReadViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class TurnViewSet(viewsets.ModelViewSet):
-    authentication_classes = [TokenAuthentication, JWTAuthentication]
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
     serializer_class = TurnFormSerializer
 
     def get_queryset(self):
-        return Turn.objects.filter(Q(user__admin=self.request.user) | Q(user__admin=self.request.user.admin))
+        return Turn.objects.filter(Q(tenant=self.request.user) | Q(tenant=self.request.user.admin))
 
     def get_permissions(self):
         if self.action == 'list':
@@ -351,3 +373,28 @@ class TurnViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
 
         return [permission() for permission in permission_classes]
+
+
+class NotificationViewSet(SelectablePaginationMixin, viewsets.ReadOnlyModelViewSet):
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = NotificationSerializer
+
+    def get_queryset(self):
+        return Notification.objects.filter(user=self.request.user)
+
+
+class RequestLogViewSet(SelectablePaginationMixin, viewsets.ReadOnlyModelViewSet):
+    authentication_classes = [TokenAuthentication, StatelessJWTAuthentication]
+    serializer_class = RequestLogSerializer
+
+    def get_queryset(self):
+        return RequestLog.objects.filter(Q(user=self.request.user) | Q(user__admin=self.request.user))
+
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [IsAuthenticated, RequestLogViewPermission]
+        else:
+            permission_classes = [IsAuthenticated]
+
+        return [permission() for permission in permission_classes]